@@ -1,6 +1,16 @@
 #!/usr/bin/python3
+import argparse
+import queue
+import threading
+import time
 from gtp_connection import GtpConnection
+from gtp_server import GtpServer
+from engine_stats import STATS
+from position_cache import POSITION_CACHE
+from tablebase import Tablebase
 from board_util import GoBoardUtil
+from uct import UctTree
+from playout_pool import PlayoutPool
 
 class RandomPlayer():
     def __init__(self):
@@ -19,14 +29,202 @@ class RandomPlayer():
         self.version = 0.1
     def get_move(self,board, color):
         return GoBoardUtil.generate_random_move(board,color)
-    
+
+
+class UctPlayer():
+    def __init__(self, num_playouts=None, time_limit=1.0, max_nodes=2000000, ponder=False, playout_pool=None):
+        """
+        Player that runs UCT Monte Carlo tree search with NoGo rules.
+        The subtree of every move played on the board is kept for the next search.
+
+        Parameters
+        ----------
+        num_playouts : int
+            playouts per move; if None the search runs until time_limit
+        time_limit : float
+            seconds per move when num_playouts is None
+        max_nodes : int
+            largest number of tree nodes kept in memory
+        ponder : bool
+            keep searching in a background thread while the opponent thinks
+        playout_pool : PlayoutPool or None
+            worker processes running batched playouts of the root moves while the
+            tree is searched; each worker gets num_playouts playouts (or the same
+            time), whose results are added to the root during the search
+
+        Attributes
+        ----------
+        set to True by this player and read by the GTP connection:
+        anytime : bool
+            get_move accepts a deadline given by the GTP time control
+        solve_endgame : bool
+            genmove plays a win proven by the exact solver when few points are empty
+        """
+        self.name = "Go1"
+        self.version = 0.1
+        self.anytime = True
+        self.solve_endgame = True
+        self.num_playouts = num_playouts
+        self.time_limit = time_limit
+        self.tree = UctTree(max_nodes=max_nodes)
+        self.playout_pool = playout_pool
+        self.ponder = ponder
+        self._ponder_thread = None
+        self._ponder_stop = threading.Event()
+
+    def get_move(self, board, color, deadline=None):
+        if deadline is None and self.num_playouts is None:
+            deadline = time.time() + self.time_limit
+        if self.playout_pool is None:
+            self.tree.search(board, color, self.num_playouts, deadline)
+            return self.tree.best_move()
+        # the thread only waits on the worker processes, so it does not slow the search;
+        # the chunks are added to the root as they come in, so the tree spends its
+        # playouts on the moves the workers found good and the most visited move
+        # reflects both
+        pool = self.playout_pool
+        budget = None if self.num_playouts is None else self.num_playouts * pool.num_workers
+        chunks = queue.Queue()
+        snapshot = board.copy()
+        helper = threading.Thread(target=pool.evaluate, args=(snapshot, color, budget, deadline, chunks.put),
+                                  daemon=True)
+
+        def feed():
+            while not chunks.empty():
+                self.tree.add_root_results(chunks.get())
+
+        helper.start()
+        self.tree.search(board, color, self.num_playouts, deadline, feed=feed)
+        helper.join()
+        feed()
+        return self.tree.best_move()
+
+    def played(self, board, point, color):
+        """ Called by the GTP connection after a move has been played on board """
+        self.stop_pondering()
+        self.tree.advance(board, point, color)
+
+    def reset(self):
+        """ Called by the GTP connection when the board is cleared """
+        self.stop_pondering()
+        self.tree.clear()
+
+    def start_pondering(self, board, color):
+        """
+        Search the position on board, color to move, in a background thread until
+        stop_pondering is called. The thread works on its own copy of the board.
+        """
+        if not self.ponder:
+            return
+        self.stop_pondering()
+        self._ponder_stop.clear()
+        self._ponder_thread = threading.Thread(target=self.tree.search,
+                                               args=(board.copy(), color),
+                                               kwargs={"stop": self._ponder_stop},
+                                               daemon=True)
+        self._ponder_thread.start()
+
+    def stop_pondering(self):
+        """ Stop the background search, keeping its statistics in the tree """
+        if self._ponder_thread is None:
+            return
+        self._ponder_stop.set()
+        self._ponder_thread.join()
+        self._ponder_thread = None
+
 
 def run():
     """
     start the gtp connection and wait for commands.
     """
-    con = GtpConnection(RandomPlayer())
-    con.start_connection()
+    parser = argparse.ArgumentParser(description="Go1 NoGo engine (GTP on stdin/stdout)")
+    parser.add_argument("--player", choices=["random", "uct"], default="random",
+                        help="move generator used by genmove")
+    parser.add_argument("--playouts", type=int, default=None,
+                        help="uct: playouts per move (default: use --time)")
+    parser.add_argument("--time", type=float, default=1.0,
+                        help="uct: seconds per move")
+    parser.add_argument("--ponder", action="store_true",
+                        help="uct: keep searching while the opponent thinks")
+    parser.add_argument("--playout-workers", type=int, default=0,
+                        help="uct: worker processes running batched playouts of the root moves (0: none)")
+    parser.add_argument("--backend", choices=["auto", "numpy", "compact", "bitboard"], default="auto",
+                        help="storage backend of the board")
+    parser.add_argument("--time-margin", type=float, default=0.1,
+                        help="seconds kept back from every move under GTP time control")
+    parser.add_argument("--log", default="/tmp/gtp_log",
+                        help="file the GTP stream is copied to; 'none' disables the log")
+    parser.add_argument("--log-max-bytes", type=int, default=0,
+                        help="size cap of the log file in bytes (0: no cap)")
+    parser.add_argument("--log-backups", type=int, default=0,
+                        help="rotated log files kept when the cap is reached (0: truncate instead)")
+    parser.add_argument("--port", type=int, default=None,
+                        help="serve GTP sessions on this TCP port instead of stdin/stdout")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address the TCP server listens on")
+    parser.add_argument("--unix", default=None, metavar="PATH",
+                        help="serve GTP sessions on this Unix socket instead of stdin/stdout")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="server: threads running genmove and legal_moves")
+    parser.add_argument("--stats", action="store_true",
+                        help="count the hot paths from the start (see the engine_stats command)")
+    parser.add_argument("--stats-dump", default=None, metavar="PATH",
+                        help="append the counters to PATH as JSON lines; implies --stats")
+    parser.add_argument("--stats-interval", type=float, default=10.0,
+                        help="seconds between two lines of --stats-dump")
+    parser.add_argument("--cache-size", type=int, default=None,
+                        help="positions kept in the legal move cache (0 disables it)")
+    parser.add_argument("--symmetric-cache", action="store_true",
+                        help="one legal move cache entry for all rotations and mirror images of a position")
+    parser.add_argument("--solve-empty", type=int, default=12,
+                        help="uct: genmove plays a proven win when at most this many points are empty (0: never)")
+    parser.add_argument("--solve-time", type=float, default=1.0,
+                        help="seconds the solver gets per genmove without time control, and per solve command by default")
+    parser.add_argument("--tablebase", action="append", default=[], metavar="PATH",
+                        help="perfect play table written by tablebase.py (may be repeated, one per board size)")
+    args = parser.parse_args()
+    if args.cache_size is not None:
+        POSITION_CACHE.resize(args.cache_size)
+    if args.symmetric_cache:
+        POSITION_CACHE.symmetric = True
+    if args.stats or args.stats_dump:
+        STATS.enable()
+    if args.stats_dump:
+        STATS.start_dump(args.stats_dump, args.stats_interval)
+    # one pool of worker processes, shared by the players of all server sessions
+    playout_pool = None
+    if args.player == "uct" and args.playout_workers > 0:
+        playout_pool = PlayoutPool(num_workers=args.playout_workers)
+    def new_player():
+        if args.player == "uct":
+            return UctPlayer(num_playouts=args.playouts, time_limit=args.time, ponder=args.ponder,
+                             playout_pool=playout_pool)
+        return RandomPlayer()
+    backend = None if args.backend == "auto" else args.backend
+    # mapped, not read: the pages are loaded as the games reach them
+    tablebases = [Tablebase(path) for path in args.tablebase]
+    if args.port is not None or args.unix is not None:
+        # every session gets its own player, board and clock
+        server = GtpServer(new_player, workers=args.workers, time_margin=args.time_margin, backend=backend,
+                           solve_empty_points=args.solve_empty, solve_time=args.solve_time,
+                           tablebases=tablebases)
+        try:
+            server.run(host=args.host, port=args.port, path=args.unix)
+        finally:
+            # the last dump line, once every session has ended
+            STATS.stop_dump()
+        return
+    player = new_player()
+    outfile = None if args.log.lower() == "none" else args.log
+    con = GtpConnection(player, outfile=outfile, time_margin=args.time_margin, backend=backend,
+                        log_max_bytes=args.log_max_bytes, log_backups=args.log_backups,
+                        solve_empty_points=args.solve_empty, solve_time=args.solve_time,
+                        tablebases=tablebases)
+    try:
+        con.start_connection()
+    finally:
+        # quit exits through here too
+        STATS.stop_dump()
 
 if __name__=='__main__':
     run()
@@ -0,0 +1,237 @@
+"""
+Lockstep batched NoGo playouts with NumPy.
+
+B games are stored as a (B, maxpoint) int8 array using the padded 1-D layout of
+GoBoard, so any GoBoard can seed the batch by copying its board array. Every step
+advances all unfinished games by one ply at once:
+    1. blocks are labelled by propagating the smallest point index through
+       same-colored neighbors (with pointer jumping),
+    2. the liberties of every block are counted from the empty points around it,
+    3. the NoGo legal moves (no captures, no suicide) of the side to move are
+       found with neighbor gathers,
+    4. one legal move per game is picked uniformly at random.
+A game ends when the side to move has no legal move; under the NoGo rules the
+side to move then loses.
+"""
+
+import numpy as np
+from board_util import BLACK, WHITE, EMPTY
+from board_geometry import BoardGeometry
+from engine_stats import STATS
+
+
+class BatchPlayout(object):
+
+    def __init__(self, size):
+        """
+        Precompute the neighbor tables of a board size.
+
+        Arguments
+        ---------
+        size : int
+            size of the boards to simulate
+        """
+        geometry = BoardGeometry.for_size(size)
+        self.size = size
+        self.NS = geometry.NS
+        self.maxpoint = geometry.maxpoint
+        # on-board points and their four neighbors, shape (N,) and (N, 4)
+        self.points = geometry.point_array
+        self.offsets = np.array([-1, 1, -self.NS, self.NS], dtype=np.intp)
+        self.neighbors = geometry.neighbor_array[self.points]
+
+    @staticmethod
+    def for_board(board):
+        """ Return a BatchPlayout with the geometry of the given GoBoard """
+        return BatchPlayout(board.size)
+
+    def seed(self, board, num_games):
+        """
+        Return a (num_games, maxpoint) int8 array holding copies of board.board
+        """
+        return np.tile(np.asarray(board.board, dtype=np.int8), (num_games, 1))
+
+    def _block_labels(self, boards):
+        """
+        Label the blocks of every board.
+
+        Arguments
+        ---------
+        boards : (B, maxpoint) int8 array
+
+        Returns
+        -------
+        labels : (B, maxpoint) int array
+            for a stone, the smallest point of its block; for other points the point itself
+        """
+        num = boards.shape[0]
+        labels = np.tile(np.arange(self.maxpoint, dtype=np.intp), (num, 1))
+        colors = boards[:, self.points]
+        stones = (colors == BLACK) | (colors == WHITE)
+        same = (boards[:, self.neighbors] == colors[:, :, None]) & stones[:, :, None]
+        big = self.maxpoint
+        while True:
+            nb_labels = np.where(same, labels[:, self.neighbors], big).min(axis=2)
+            new = np.minimum(labels[:, self.points], nb_labels)
+            # pointer jumping: follow the label of the label
+            new = np.take_along_axis(labels, new, axis=1)
+            if np.array_equal(new, labels[:, self.points]):
+                return labels
+            labels[:, self.points] = new
+
+    def _liberty_counts(self, boards, labels):
+        """
+        Count the liberties of every block.
+
+        Returns
+        -------
+        counts : (B, maxpoint) int array
+            counts[b, label] is the number of liberties of that block of board b
+        """
+        num = boards.shape[0]
+        empty = boards[:, self.points] == EMPTY
+        nb_colors = boards[:, self.neighbors]
+        nb_labels = labels[:, self.neighbors]
+        is_stone = (nb_colors == BLACK) | (nb_colors == WHITE)
+        # an empty point is one liberty of each distinct block around it
+        first = is_stone & empty[:, :, None]
+        for k in range(1, 4):
+            for j in range(k):
+                first[:, :, k] &= ~(is_stone[:, :, j] & (nb_labels[:, :, j] == nb_labels[:, :, k]))
+        rows = np.broadcast_to(np.arange(num)[:, None, None]*self.maxpoint, nb_labels.shape)
+        keys = (rows + nb_labels)[first]
+        counts = np.bincount(keys, minlength=num*self.maxpoint)
+        return counts.reshape(num, self.maxpoint)
+
+    def _merge_labels(self, boards, labels, move, color):
+        """
+        Update the block labels after color has been played on move, in place.
+        No stones are ever removed in NoGo, so the blocks next to the move only merge.
+
+        Arguments
+        ---------
+        boards : (B, maxpoint) int8 array, with the move already played
+        labels : (B, maxpoint) int array
+        move : (B,) int array
+        color : (B,) int8 array
+        """
+        rows = np.arange(boards.shape[0])[:, None]
+        around = move[:, None] + self.offsets[None, :]
+        same = boards[rows, around] == color[:, None]
+        nb_labels = labels[rows, around]
+        new = np.where(same, nb_labels, self.maxpoint).min(axis=1)
+        new = np.minimum(new, move)
+        labels[rows[:, 0], move] = new
+        for k in range(4):
+            old = np.where(same[:, k], nb_labels[:, k], -1)
+            labels[:] = np.where(labels == old[:, None], new[:, None], labels)
+
+    def legal_masks(self, boards, to_move, labels=None):
+        """
+        NoGo legal moves of the side to move on every board.
+
+        Arguments
+        ---------
+        boards : (B, maxpoint) int8 array
+        to_move : (B,) array of {BLACK, WHITE}
+        labels : (B, maxpoint) int array, optional
+            block labels of the boards if already known
+
+        Returns
+        -------
+        legal : (B, N) bool array over self.points
+        """
+        num = boards.shape[0]
+        if labels is None:
+            labels = self._block_labels(boards)
+        counts = self._liberty_counts(boards, labels)
+        empty = boards[:, self.points] == EMPTY
+        nb_colors = boards[:, self.neighbors]
+        nb_libs = np.take_along_axis(counts, labels[:, self.neighbors].reshape(num, -1),
+                                     axis=1).reshape(nb_colors.shape)
+        own = np.asarray(to_move, dtype=np.int8)[:, None, None]
+        opp = (BLACK + WHITE) - own
+        capture = ((nb_colors == opp) & (nb_libs == 1)).any(axis=2)
+        has_liberty = ((nb_colors == EMPTY) | ((nb_colors == own) & (nb_libs > 1))).any(axis=2)
+        return empty & ~capture & has_liberty
+
+    def play(self, boards, to_move, rng=None):
+        """
+        Play every game to the end, in place.
+
+        Arguments
+        ---------
+        boards : (B, maxpoint) int8 array
+            the start positions; played out in place
+        to_move : (B,) array of {BLACK, WHITE}
+            side to move in each game
+        rng : numpy.random.Generator, optional
+
+        Returns
+        -------
+        winners : (B,) int8 array of {BLACK, WHITE}
+        moves : (B, N) int array
+            the points played in each game, padded with -1
+        lengths : (B,) int array
+            number of moves played in each game
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        num = boards.shape[0]
+        to_move = np.array(to_move, dtype=np.int8).reshape(-1)
+        if to_move.shape[0] == 1:
+            to_move = np.repeat(to_move, num)
+        winners = np.zeros(num, dtype=np.int8)
+        moves = np.full((num, len(self.points)), -1, dtype=np.intp)
+        lengths = np.zeros(num, dtype=np.intp)
+        active = np.arange(num)
+        # block labels are computed once, then only merged around each move
+        labels = self._block_labels(boards)
+        sub = boards
+        while active.size:
+            legal = self.legal_masks(sub, to_move[active], labels)
+            finished = ~legal.any(axis=1)
+            if finished.any():
+                done = active[finished]
+                winners[done] = (BLACK + WHITE) - to_move[done]
+                boards[done] = sub[finished]
+                active = active[~finished]
+                sub = sub[~finished]
+                labels = labels[~finished]
+                legal = legal[~finished]
+                if not active.size:
+                    break
+            # uniform choice among the legal moves of each game
+            keys = rng.random(legal.shape)
+            keys[~legal] = -1.0
+            move = self.points[keys.argmax(axis=1)]
+            sub[np.arange(active.size), move] = to_move[active]
+            self._merge_labels(sub, labels, move, to_move[active])
+            moves[active, lengths[active]] = move
+            lengths[active] += 1
+            to_move[active] = (BLACK + WHITE) - to_move[active]
+        if STATS.enabled:
+            STATS.playouts(len(lengths), int(lengths.sum()))
+        return winners, moves, lengths
+
+    def playouts(self, board, color, num_games, rng=None):
+        """
+        Play num_games random NoGo games from a GoBoard position.
+
+        Arguments
+        ---------
+        board : GoBoard
+            start position, left untouched
+        color : {BLACK, WHITE}
+            side to move
+        num_games : int
+        rng : numpy.random.Generator, optional
+
+        Returns
+        -------
+        winners, moves, lengths : see play
+        """
+        if board.size != self.size:
+            raise ValueError("board size %d does not match the batch size %d" % (board.size, self.size))
+        boards = self.seed(board, num_games)
+        return self.play(boards, np.full(num_games, color, dtype=np.int8), rng)
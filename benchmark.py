@@ -0,0 +1,257 @@
+#!/usr/bin/python3
+"""
+Microbenchmarks of the board primitives and of random playouts.
+
+Every benchmark runs at each board size on a mid-game position: a random game
+from the empty board, stopped once about half of the points are filled. All
+positions and moves come from fixed seeds, so two runs measure the same work.
+
+The result is JSON:
+    {"meta": {...}, "results": {"<size>": {"<benchmark>": operations per second}}}
+and a run can be compared against a stored baseline; any benchmark that got
+slower than the baseline by more than the threshold is reported as a regression
+(and the exit status is 1).
+
+    python benchmark.py --output base.json
+    python benchmark.py --baseline base.json --threshold 0.1
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+from board import GoBoard
+from board_util import GoBoardUtil, BLACK, WHITE
+from position_cache import PositionCache
+
+SIZES = (3, 5, 7, 9, 13, 19)
+SEED = 20181018
+
+
+def mid_game(size, seed=SEED, fill=0.5):
+    """
+    A reproducible mid-game position
+
+    Returns
+    -------
+    (board, color to move)
+    """
+    rng = random.Random(seed + size)
+    board = GoBoard(size)
+    color = BLACK
+    target = int(size*size*fill)
+    for _ in range(target):
+        move = board.random_legal_move(color, rng)
+        if move is None:
+            break
+        board.move(move, color)
+        color = GoBoardUtil.opponent(color)
+    return board, color
+
+
+def continuation(board, color, seed=SEED):
+    """ A random sequence of legal moves from board, alternating colors """
+    rng = random.Random(seed)
+    board = board.copy()
+    moves = []
+    while True:
+        move = board.random_legal_move(color, rng)
+        if move is None:
+            return moves
+        board.play_undoable(move, color)
+        moves.append((move, color))
+        color = GoBoardUtil.opponent(color)
+
+
+def measure(run, min_time, repeats):
+    """
+    Call run() until min_time seconds have passed, repeats times
+
+    Arguments
+    ---------
+    run : callable
+        does some operations and returns (operations done, seconds they took)
+
+    Returns
+    -------
+    operations per second of the fastest repeat
+    """
+    best = 0.0
+    for _ in range(repeats):
+        ops = 0
+        seconds = 0.0
+        while seconds < min_time:
+            n, t = run()
+            ops += n
+            seconds += t
+        best = max(best, ops / seconds)
+    return best
+
+
+def _timed(function, *args):
+    # enough calls per timing that the timer itself does not show in microsecond operations
+    calls = 100
+    start = time.perf_counter()
+    for _ in range(calls):
+        function(*args)
+    return calls, time.perf_counter() - start
+
+
+def benchmarks(size):
+    """
+    The benchmarks of one board size
+
+    Returns
+    -------
+    dict name -> run function for measure
+    """
+    board, color = mid_game(size)
+    moves = continuation(board, color)
+    points = board.get_all_positions()
+    # generate_legal_moves answers from the shared position cache, and timing it on
+    # one board would only time cache hits: the uncached path (legal moves and the
+    # formatted response) is timed through a disabled cache, hits separately
+    uncached = PositionCache(0)
+    cache = PositionCache()
+    cache.legal_response(board, color)
+
+    def play_move():
+        b = board.copy()
+        start = time.perf_counter()
+        for move, c in moves:
+            b._play_move(move, c)
+        return len(moves), time.perf_counter() - start
+
+    def check_legal():
+        start = time.perf_counter()
+        for p in points:
+            board.check_legal(p, BLACK)
+            board.check_legal(p, WHITE)
+        return 2*len(points), time.perf_counter() - start
+
+    def random_move():
+        start = time.perf_counter()
+        for _ in range(100):
+            GoBoardUtil.generate_random_move(board, color)
+        return 100, time.perf_counter() - start
+
+    def playout():
+        b = GoBoard(size)
+        start = time.perf_counter()
+        GoBoardUtil.play(0, b, BLACK)
+        return 1, time.perf_counter() - start
+
+    return {
+        "play_move": play_move,
+        "check_legal": check_legal,
+        "generate_legal_moves": lambda: _timed(uncached.legal_response, board, color),
+        "legal_moves_cache_hit": lambda: _timed(cache.legal_response, board, color),
+        "generate_random_move": random_move,
+        "final_score": lambda: _timed(board.final_score, 0),
+        "copy": lambda: _timed(board.copy),
+        "playout": playout,
+    }
+
+
+def run(sizes=SIZES, names=None, min_time=0.2, repeats=3, seed=SEED, log=None):
+    """
+    Run the benchmarks
+
+    Arguments
+    ---------
+    sizes : iterable of int
+    names : iterable of str or None
+        benchmarks to run, all if None
+    log : file-like or None
+        progress lines go here
+
+    Returns
+    -------
+    the JSON document as a dict
+    """
+    results = {}
+    for size in sizes:
+        results[str(size)] = {}
+        for name, function in benchmarks(size).items():
+            if names and name not in names:
+                continue
+            # the same random draws on every run
+            random.seed(seed)
+            np.random.seed(seed % 2**32)
+            rate = measure(function, min_time, repeats)
+            results[str(size)][name] = rate
+            if log is not None:
+                log.write("%3d %-22s %12.1f /s\n" % (size, name, rate))
+                log.flush()
+    meta = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": seed,
+        "min_time": min_time,
+        "repeats": repeats,
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(current, baseline):
+    """
+    Compare two benchmark documents
+
+    Returns
+    -------
+    list of (size, name, baseline rate, current rate, change) for every benchmark
+    in both documents; change is the relative difference of the rates
+    """
+    rows = []
+    for size, rates in current["results"].items():
+        base_rates = baseline["results"].get(size, {})
+        for name, rate in rates.items():
+            base = base_rates.get(name)
+            if not base:
+                continue
+            rows.append((size, name, base, rate, rate / base - 1))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the board primitives and playouts")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES),
+                        help="comma separated board sizes")
+    parser.add_argument("--only", default=None, help="comma separated benchmark names")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+    parser.add_argument("--repeats", type=int, default=3, help="repeats, the fastest is kept")
+    parser.add_argument("--output", default=None, metavar="PATH", help="write the JSON here instead of stdout")
+    parser.add_argument("--baseline", default=None, metavar="PATH", help="JSON of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="slowdown against the baseline reported as a regression")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+    names = args.only.split(",") if args.only else None
+    document = run(sizes, names, args.min_time, args.repeats, log=sys.stderr)
+    text = json.dumps(document, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = 0
+    for size, name, base, rate, change in compare(document, baseline):
+        flag = ""
+        if change < -args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        sys.stderr.write("%3s %-22s %12.1f -> %12.1f /s %+7.1f%%%s\n" % (size, name, base, rate, 100*change, flag))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
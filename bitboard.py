@@ -0,0 +1,190 @@
+"""
+Bitboard legality engine for NoGo.
+
+A position is held as Python ints used as bit sets: bit p stands for point p of
+the padded 1-D layout of GoBoard (see GoBoard.reset). Because every row is
+separated by a border point, moving one step on the board is a shift by 1
+(west/east) or by NS (south/north), and anything shifted onto the border or
+off the board is cleared by masking with the on-board mask.
+
+Groups are expanded with shift/and/or until they stop growing, and liberties are
+the intersection of a group's neighbors with the empty mask, so the legal moves of a
+color are found with a handful of word operations per block instead of a Python
+loop over every point.
+"""
+
+from board_util import GoBoardUtil
+from board_geometry import BoardGeometry
+
+
+class BitBoard(object):
+
+    _cache = {}
+
+    @staticmethod
+    def for_size(size):
+        """
+        Return the (shared) BitBoard engine of the given board size
+        """
+        engine = BitBoard._cache.get(size)
+        if engine is None:
+            engine = BitBoard(size)
+            BitBoard._cache[size] = engine
+        return engine
+
+    def __init__(self, size):
+        """
+        Precompute the masks of a board size
+
+        Arguments
+        ---------
+        size : int
+            size of the board (at most 25, the largest size GTP coordinates allow)
+        """
+        if not 0 < size <= 25:
+            raise ValueError("board_size out of range")
+        self.size = size
+        self.NS = size + 1
+        onboard = 0
+        for point in BoardGeometry.for_size(size).points:
+            onboard |= 1 << point
+        self.onboard = onboard
+
+    def neighbors(self, mask):
+        """
+        Return the on-board points next to any point of mask (the dilation of mask
+        without mask itself being added)
+        """
+        NS = self.NS
+        return ((mask << 1) | (mask >> 1) | (mask << NS) | (mask >> NS)) & self.onboard
+
+    def flood(self, seed, within):
+        """
+        Grow seed inside the mask within until it stops growing
+
+        Returns
+        -------
+        mask of the points of within connected to seed
+        """
+        NS = self.NS
+        block = seed
+        while True:
+            grown = (block | (block << 1) | (block >> 1) | (block << NS) | (block >> NS)) & within
+            if grown == block:
+                return block
+            block = grown
+
+    def blocks(self, stones):
+        """
+        Split a mask of stones into its blocks
+
+        Returns
+        -------
+        list of block masks
+        """
+        result = []
+        while stones:
+            block = self.flood(stones & -stones, stones)
+            result.append(block)
+            stones &= ~block
+        return result
+
+    def legal_mask(self, own, opp, ko=None):
+        """
+        Legal moves of the player owning the stones own under the NoGo rules
+        (no captures, no suicide)
+
+        Arguments
+        ---------
+        own, opp : int
+            stone masks of the player to move and of the opponent
+        ko : int or None
+            ko point, never legal
+
+        Returns
+        -------
+        mask of the legal points
+        """
+        empty = self.onboard & ~(own | opp)
+        # the only liberty of an opponent block would capture it
+        captures = 0
+        for block in self.blocks(opp):
+            libs = self.neighbors(block) & empty
+            if libs & (libs - 1) == 0:
+                captures |= libs
+        # joining an own block with another liberty is never suicide
+        safe = 0
+        for block in self.blocks(own):
+            libs = self.neighbors(block) & empty
+            if libs & (libs - 1):
+                safe |= block
+        legal = empty & self.neighbors(empty | safe) & ~captures
+        if ko is not None:
+            legal &= ~(1 << ko)
+        return legal
+
+    def is_legal(self, point, own, opp, ko=None):
+        """
+        Whether point is a legal move for the owner of own; only the blocks next to
+        point are expanded
+
+        Arguments
+        ---------
+        point : int
+        own, opp : int
+            stone masks of the player to move and of the opponent
+        ko : int or None
+
+        Returns
+        -------
+        bool
+        """
+        bit = 1 << point
+        if point == ko or not (self.onboard & bit) or (own | opp) & bit:
+            return False
+        empty = self.onboard & ~(own | opp)
+        around = self.neighbors(bit)
+        opp_around = around & opp
+        while opp_around:
+            block = self.flood(opp_around & -opp_around, opp)
+            if self.neighbors(block) & empty == bit:
+                return False
+            opp_around &= ~block
+        if around & empty:
+            return True
+        own_around = around & own
+        while own_around:
+            block = self.flood(own_around & -own_around, own)
+            if self.neighbors(block) & empty & ~bit:
+                return True
+            own_around &= ~block
+        return False
+
+    @staticmethod
+    def points(mask):
+        """
+        Return the points of a mask in increasing order
+        """
+        result = []
+        while mask:
+            low = mask & -mask
+            result.append(low.bit_length() - 1)
+            mask ^= low
+        return result
+
+    def legal_moves(self, board, color):
+        """
+        Legal moves of color on a GoBoard, computed from the board's stone masks
+
+        Arguments
+        ---------
+        board : GoBoard
+        color : {BLACK, WHITE}
+
+        Returns
+        -------
+        list of points
+        """
+        own = board._bits[color]
+        opp = board._bits[GoBoardUtil.opponent(color)]
+        return BitBoard.points(self.legal_mask(own, opp, board.ko_constraint))
@@ -13,8 +13,28 @@ glossary:
 """
 
 
+import random
 import numpy as np
 from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, FLOODFILL
+from bitboard import BitBoard
+from board_backend import select_backend
+from board_geometry import BoardGeometry
+
+"""
+Zobrist keys: one random 64-bit number per (color, point), large enough for the
+biggest board (25x25), plus one key that is added when white is to move.
+The seed is fixed so hashes are the same in every process.
+"""
+_zobrist_rng = np.random.RandomState(20181018)
+_ZOBRIST_POINTS = 25*25 + 3*(25+1)
+ZOBRIST = {
+    BLACK: [int(k) for k in _zobrist_rng.randint(0, 2**63, _ZOBRIST_POINTS, dtype=np.int64)],
+    WHITE: [int(k) for k in _zobrist_rng.randint(0, 2**63, _ZOBRIST_POINTS, dtype=np.int64)],
+}
+ZOBRIST_WHITE_TO_MOVE = int(_zobrist_rng.randint(0, 2**63, dtype=np.int64))
+
+# rejected draws of random_legal_move before it falls back to scanning the legal moves
+RANDOM_MOVE_TRIES = 8
 
 class GoBoard(object):
 
@@ -60,6 +80,16 @@ class GoBoard(object):
         pass
 
 
+    @property
+    def hash(self):
+        """
+        64-bit Zobrist hash of the position, including the side to move
+        (the opponent of the last played color, black on an empty board).
+        """
+        if self.last_played_color == BLACK:
+            return self._stone_hash ^ ZOBRIST_WHITE_TO_MOVE
+        return self._stone_hash
+
     def get_color(self, point):
         """
         Return the state of the specified point.
@@ -78,34 +108,13 @@ class GoBoard(object):
             bool
             Whether the playing point with the given color is
             legal.
+        The answer comes straight from the block structure (or the bitboard
+        engine when use_bitboard is set), so the board is never touched.
         """
-        sboard = np.array(self.board, copy=True)
-        # swap out true board for simulation board, and try to play the move
-        result, _=self._play_move(point, color)
-        """
-    ###########################
-        #print(point)
-        coordinate = self._point_to_coord(point)
-        cr = GoBoardUtil.int_to_color(color)
-        pr = coord_to_position(coordinate)
-        #print("COMMENCE THE HACK")
-        ###### HACK TIME COMMENCE
-        # this is pretty dank as it abuses the ValueError, but it works and time is tight so whatev for now -adam
-        if msg == "occupied":
-            raise ValueError("illegal move: %s %s occupied"%(cr,pr))
-            return False
-        if msg == "suicide":
-            raise ValueError("illegal move: %s %s suicide"%(cr,pr))
-            return False
-        if msg == "captured":
-            raise ValueError("illegal move: %s %s capture"%(cr,pr))
-            return False
-        ###### HACK TIME ENDS
-    ############################
-        """
-        # reset true board; return result
-        self.board = sboard
-        return result
+        if self.use_bitboard:
+            return self._bitboard.is_legal(point, self._bits[color],
+                                           self._bits[GoBoardUtil.opponent(color)], self.ko_constraint)
+        return self._is_legal(point, color)
 
     def final_score(self,komi):
         """
@@ -118,17 +127,10 @@ class GoBoard(object):
             and n is number of points that color has more than the other.
         This function is based of https://github.com/Rochester-NRT/RocAlphaGo/blob/develop/AlphaGo/go.py --> get_winner
         """
-        # Count number of positions filled by each player, plus 1 for each eye-ish space owned
-        score_white = np.sum(self.board == WHITE)
-        score_black = np.sum(self.board == BLACK)
-        empties = list(*np.where(self.board == EMPTY))
-        for empty in empties:
-            # Check that all surrounding points are of one color
-            result = self._is_eyeish(empty)
-            if result==BLACK:
-                score_black += 1
-            elif result==WHITE:
-                score_white += 1
+        # Count number of positions filled by each player, plus every empty region that only touches that player
+        territory_black, territory_white = self._territory()
+        score_white = self._stone_count[WHITE] + territory_white
+        score_black = self._stone_count[BLACK] + territory_black
         score_white += komi
         score_white -= self.passes_white
         score_black -= self.passes_black
@@ -150,6 +152,45 @@ class GoBoard(object):
 
         return result
 
+    def _territory(self):
+        """
+        Empty points owned by each color: an empty region belongs to a color if
+        it touches stones of that color only.
+        A plain fill over the empty points; on one board it beats NumPy region
+        labelling, whose per-call overhead dominates at these sizes.
+        Return
+        ---------
+        black, white : int
+        """
+        board = self.board
+        neighbors = self.geometry.neighbors
+        seen = set()
+        black = white = 0
+        for start in self._empty_points:
+            if start in seen:
+                continue
+            seen.add(start)
+            stack = [start]
+            size = 0
+            # BLACK and WHITE are bits 1 and 2, so this ends up BLACK, WHITE or both
+            touches = 0
+            while stack:
+                p = stack.pop()
+                size += 1
+                for n in neighbors[p]:
+                    c = board[n]
+                    if c == EMPTY:
+                        if n not in seen:
+                            seen.add(n)
+                            stack.append(n)
+                    elif c != BORDER:
+                        touches |= c
+            if touches == BLACK:
+                black += size
+            elif touches == WHITE:
+                white += size
+        return black, white
+
     def get_winner(self,komi):
         """
         Returns:
@@ -165,9 +206,10 @@ class GoBoard(object):
         a two dimensional numpy array with same values as in the self.board without having the borders
         """
         board = np.zeros((self.size,self.size),dtype=np.int32)
+        full_board = self.backend.to_array(self.board)
         for i in range(self.size):
             row=(i+1)*self.NS+1
-            board[i,:] = self.board[row:row+self.size]
+            board[i,:] = full_board[row:row+self.size]
         return board
 
 
@@ -180,21 +222,17 @@ class GoBoard(object):
             list of empty poisitions by excluding eye points and KO constraint points
         """
         moves = []
-        for y in range(1,self.size+1,1):
-            for x in range(1,self.size+1,1):
-                point = self._coord_to_point(x,y)
-                if self.get_color(point)!=EMPTY:
-                    continue
-                if self.is_eye(point,color):
-                    ####custom code starts
-                    #print(point)
-                    #print(color)
-                    moves.append(point) #hi, this is to allow same color eye filling - adam
-                    ####custom code end
-                    continue
-                if self.ko_constraint==point:
-                    continue
-                moves.append(point)
+        for point in self.geometry.points:
+            if self.get_color(point)!=EMPTY:
+                continue
+            if self.is_eye(point,color):
+                ####custom code starts
+                moves.append(point) #hi, this is to allow same color eye filling - adam
+                ####custom code end
+                continue
+            if self.ko_constraint==point:
+                continue
+            moves.append(point)
         #print(moves)
         return moves
 
@@ -206,22 +244,22 @@ class GoBoard(object):
         Return:
             list of all positions
         """
-        #BECAUSE THIS SHOULD BE PART OF THE INITIALIZATION IN MY HUMBLE OPINION
-        moves = []
-        for y in range(1,self.size+1,1):
-            for x in range(1,self.size+1,1):
-                point = self._coord_to_point(x,y)
-                moves.append(point)
-        return moves
+        # the list is precomputed once per board size in the shared geometry
+        return list(self.geometry.points)
 
-    def __init__(self, size):
+    def __init__(self, size, backend=None):
         """
         Creates a board that uses 1 dimenstional reperesentaion of for points
         ----------
         This board has the following functionalities:
             1. move :plays a move at given point
             2.
+        backend : str or None
+            storage backend of self.board ("numpy", "compact" or "bitboard"),
+            chosen by board size if None
         """
+        # None picks the board storage backend by size, see board_backend
+        self.backend_name = backend
         # initialize using reset since it would be the same code as in __init__
         self.reset(size)
 
@@ -278,15 +316,57 @@ class GoBoard(object):
         3  3  3  3  3
 
         """
-        self.board = np.ones((self.maxpoint),dtype=np.int16)*BORDER
-        self._empty_filling(self.board)
+        self.geometry = BoardGeometry.for_size(size)
+        self.backend = select_backend(size, self.backend_name)
+        self.board = self.backend.new_board(size)
+        """
+        Blocks (connected stones of one color) are kept up to date on every move
+        instead of being flood filled again:
+            _anchor[point]  : id of the block the stone on point belongs to (None if no stone)
+            _stones[anchor] : list of points in the block
+            _libs[anchor]   : set of empty points next to the block
+        The id of a block is one of its points.
+        """
+        self._anchor = [None]*self.maxpoint
+        self._stones = {}
+        self._libs = {}
+        self._undo_stack = []
+        self._stone_hash = 0
+        # stone masks for the bitboard engine, bit p is point p
+        self._bits = {BLACK:0, WHITE:0}
+        # stones on the board per color, for final_score
+        self._stone_count = {BLACK:0, WHITE:0}
+        self._bitboard = BitBoard.for_size(size)
+        # route check_legal and get_legal_moves through the bitboard engine
+        self.use_bitboard = self.backend.use_bitboard
+        # legal moves of each color under the NoGo rules, rechecked locally after every move
+        self._legal = {BLACK:set(), WHITE:set()}
+        self._update_legal(self.geometry.points)
+        # empty points in a list for O(1) uniform draws; _empty_index[point] is the
+        # position of point in _empty_points, -1 if the point is not empty
+        self._empty_points = list(self.geometry.points)
+        self._empty_index = [-1]*self.maxpoint
+        for i, p in enumerate(self._empty_points):
+            self._empty_index[p] = i
 
 
     def copy(self):
         """Return an independent copy of this Board."""
-        b = GoBoard(self.size)
-        b.board = np.copy(self.board)
+        # skip __init__: the size dependent tables are shared, not rebuilt
+        b = GoBoard.__new__(GoBoard)
+        b.name = self.name
+        b.version = self.version
+        b.size = self.size
+        b.maxpoint = self.maxpoint
+        b.geometry = self.geometry
+        b.backend = self.backend
+        b.backend_name = self.backend_name
+        b._bitboard = self._bitboard
+        b._empty_positions = {BLACK:[],WHITE:[]}
+        b._undo_stack = []
+        b.board = self.backend.copy(self.board)
         b.suicide = self.suicide  # checking for suicide move
+        b.use_bitboard = self.use_bitboard
         b.winner = self.winner
         b.NS = self.NS
         b.WE = self.WE
@@ -298,22 +378,23 @@ class GoBoard(object):
         b.ko_constraint =  self.ko_constraint
         b.white_captures = self.white_captures
         b.black_captures = self.black_captures
+        self._copy_incremental_state(b)
 
         return b
 
-
-    def _empty_filling(self,board):
+    def _copy_incremental_state(self, b):
         """
-        Fills points inside board with EMPTY
-        Arguments
-        ---------
-        board : numpy array
-            receives a numpy array filled with BORDER
-
+        Copy the incrementally kept state (blocks, legal moves, hash) of this board into board b
         """
-        for ind in range(1,self.size+1,1):
-            indices = [j for j in range(ind*self.NS + 1,ind*self.NS+self.size+1,1)]
-            np.put(board,indices, EMPTY)
+        b._anchor = list(self._anchor)
+        b._stones = {a: list(stones) for a, stones in self._stones.items()}
+        b._libs = {a: set(libs) for a, libs in self._libs.items()}
+        b._legal = {BLACK:set(self._legal[BLACK]), WHITE:set(self._legal[WHITE])}
+        b._stone_hash = self._stone_hash
+        b._bits = dict(self._bits)
+        b._stone_count = dict(self._stone_count)
+        b._empty_points = list(self._empty_points)
+        b._empty_index = list(self._empty_index)
 
 
     def is_eye(self,point,color):
@@ -393,24 +474,20 @@ class GoBoard(object):
         Return
         ---------
         liberty: int
-             Number of liberty that the given point has
-        """
-
-        group_points = [point]
-        liberty=0
-        met_points=[point]
-        while group_points:
-            p=group_points.pop()
-            met_points.append(p)
-            neighbors = self._neighbors(p)
-            for n in neighbors:
-                if self.board[n]==BORDER:
-                    continue
-                if self.board[n]==color and n not in met_points:
-                    group_points.append(n)
-                elif self.board[n]==EMPTY and n not in met_points:
-                    liberty+=1
-        return liberty
+             Number of liberty that the given point has.
+             For an empty point this is the number of liberties the block would
+             have after color plays there.
+        """
+        if self.board[point] == color:
+            return len(self._libs[self._anchor[point]])
+        libs = set()
+        for n in self._neighbors(point):
+            if self.board[n] == EMPTY:
+                libs.add(n)
+            elif self.board[n] == color:
+                libs |= self._libs[self._anchor[n]]
+        libs.discard(point)
+        return len(libs)
 
 
     def _liberty_flood(self,board):
@@ -426,11 +503,12 @@ class GoBoard(object):
         bool:
              whether the flood filled group in the board has any liberty
         """
-        #cond = board==FLOODFILL
-        #inds = np.where(cond)
         inds = list(*np.where(board == FLOODFILL))
+        if inds and self._anchor[inds[0]] is not None:
+            # a block of stones: its liberties are already known
+            return len(self._libs[self._anchor[inds[0]]]) > 0
         for f in inds:
-            f_neighbors = self._neighbors(f)
+            f_neighbors = list(self._neighbors(f))
             found_liberties = board[f_neighbors]==EMPTY
             if found_liberties.any():
                 return True
@@ -450,7 +528,10 @@ class GoBoard(object):
          FLOODFILL(=4)
          This is based on https://github.com/pasky/michi/blob/master/michi.py --> floodfill
         """
-        fboard = np.array(self.board, copy=True)
+        fboard = np.array(self.backend.to_array(self.board), copy=True)
+        if self._anchor[point] is not None:
+            fboard[self._stones[self._anchor[point]]] = FLOODFILL
+            return fboard
         flood_list=[point]
         color = fboard[point]
         fboard[point] = FLOODFILL
@@ -464,11 +545,9 @@ class GoBoard(object):
         return fboard
 
 
-
-
-    def _play_move(self,point, color):
+    def _check_move(self, point, color):
         """
-        This function is for playing the move
+        Check a move under the NoGo rules (no captures, no suicide) without playing it
         Arguments
         ---------
         point, color
@@ -477,75 +556,349 @@ class GoBoard(object):
         ---------
         State of move and appropriate message for that move
         """
-
         if self.board[point] != EMPTY:
-            c=self._point_to_coord(point)
-           # stone = self.board[point] # get stone colour currently occupying spot
-           # print(stone)
-           # illegal move: w [location] occupied
-           # player_errors(1, color, c)
             # hi, adam here. I think this is good to go for now -adam
             msg = "occupied" # -adam
             return False, msg
         if point == self.ko_constraint:
             msg ="KO move is not permitted!"
             return False , msg
+        opp_color = GoBoardUtil.opponent(color)
+        has_liberty = False
+        for n in self._neighbors(point):
+            n_color = self.board[n]
+            if n_color == EMPTY:
+                has_liberty = True
+            elif n_color == opp_color:
+                if len(self._libs[self._anchor[n]]) == 1:
+                    # point is the last liberty of the opponent block
+                    msg = "captured" #for adams fancy little error check in play_cmd
+                    return False, msg
+            elif n_color == color:
+                if len(self._libs[self._anchor[n]]) > 1:
+                    has_liberty = True
+        if not has_liberty:
+            msg = "suicide"
+            return False, msg
+        c=self._point_to_coord(point)
+        msg = "Playing a move with %s color in the row and column %d %d is permited"%(GoBoardUtil.int_to_color(color),c[0],c[1])
+        return True, msg
+
+
+    def _is_legal(self, point, color):
+        """
+        Same answer as _check_move, without building the message; used on the hot paths
+        Arguments
+        ---------
+        point, color
+
+        Return
+        ---------
+        bool
+        """
+        board = self.board
+        if board[point] != EMPTY or point == self.ko_constraint:
+            return False
+        opp_color = BLACK + WHITE - color
+        libs = self._libs
+        anchor = self._anchor
+        has_liberty = False
+        for n in self.geometry.neighbors[point]:
+            n_color = board[n]
+            if n_color == EMPTY:
+                has_liberty = True
+            elif n_color == opp_color:
+                if len(libs[anchor[n]]) == 1:
+                    return False
+            elif n_color == color and not has_liberty:
+                if len(libs[anchor[n]]) > 1:
+                    has_liberty = True
+        return has_liberty
+
+
+    def _place_stone(self, point, color):
+        """
+        Put a stone on the board and update the blocks around it.
+        The move is assumed to be legal.
+        Arguments
+        ---------
+        point, color
+
+        Return
+        ---------
+        change: tuple
+            what _remove_stone needs to take the stone back:
+            (point, opponent blocks that lost the liberty, block of the stone,
+             merged blocks, old stone count of the block, liberties added to the block)
+        """
         self.board[point] = color
-        self._is_empty = False
-        self.caps = []
-        single_captures = []
-        cap_inds = None
-        neighbors = self._neighbors(point)
-        for n in neighbors:
-            if self.board[n]==BORDER:
+        self._stone_hash ^= ZOBRIST[color][point]
+        self._bits[color] |= 1 << point
+        self._stone_count[color] += 1
+        # swap the last empty point into the slot of point
+        empty_points = self._empty_points
+        i = self._empty_index[point]
+        last = empty_points.pop()
+        if last != point:
+            empty_points[i] = last
+            self._empty_index[last] = i
+        self._empty_index[point] = -1
+        new_libs = set()
+        same_blocks = []
+        opp_blocks = []
+        for n in self._neighbors(point):
+            n_color = self.board[n]
+            if n_color == EMPTY:
+                new_libs.add(n)
+            elif n_color == BORDER:
+                continue
+            else:
+                anchor = self._anchor[n]
+                if n_color == color:
+                    if anchor not in same_blocks:
+                        same_blocks.append(anchor)
+                elif anchor not in opp_blocks:
+                    opp_blocks.append(anchor)
+                    self._libs[anchor].discard(point)
+        if not same_blocks:
+            self._anchor[point] = point
+            self._stones[point] = [point]
+            self._libs[point] = new_libs
+            change = (point, opp_blocks, point, None, 0, None)
+            self._update_legal(self._affected_points(change))
+            return change
+        # merge the smaller blocks into the biggest one
+        anchor = max(same_blocks, key=lambda a: len(self._stones[a]))
+        stones = self._stones[anchor]
+        libs = self._libs[anchor]
+        old_len = len(stones)
+        merged = []
+        added_libs = []
+        for a in same_blocks:
+            if a == anchor:
                 continue
-            if self.board[n]!=color:
-                if self.board[n]!=EMPTY:
-                    fboard = self._flood_fill(n)
-                    if not self._liberty_flood(fboard):
-                       # below: removing last liberty not allowed. remove stone and output error - kaleb
-                        c=self._point_to_coord(point)
-                        #msg = "illegal move:  %s %s captures"%(GoBoardUtil.int_to_color(color), coord_to_position(c)) # no liberties left
-                        msg = "captured" #for adams fancy little error check in play_cmd
-                        self.board[point] = EMPTY
-                        return False, msg
-                        """
-                        cap_inds = fboard==FLOODFILL
-                        #self.caps = np.where(fboard==FLOODFILL)
-                        self.caps += list(*np.where(fboard==FLOODFILL))
-                        num_captures = np.sum(cap_inds)
-                        if num_captures == self.size*self.size:
-                            self._is_empty = True
-                        if num_captures == 1:
-                            #single_captures.append(n)
-                            print("pls no caps")
-                        if color==WHITE:
-                            #self.white_captures += num_captures
-                            print("pls no white caps")
-                        else :
-                            #self.black_captures += num_captures
-                            print("pls no black caps")
-                        self.board[cap_inds]=EMPTY
-                        """
-        in_enemy_eye = self._is_eyeish(point) != color
-        fboard = self._flood_fill(point)
-        self.ko_constraint = single_captures[0] if in_enemy_eye and len(single_captures) == 1 else None
-        #if self._liberty_flood(fboard) and self.suicide: #commented out original to test what self.suicide did since it's just set for True - adam
-        if self._liberty_flood(fboard): #took out suicide - adam
-            #non suicidal move
-            # still not sure what self.suicide is for -adam
-            c=self._point_to_coord(point)
-            msg = "Playing a move with %s color in the row and column %d %d is permited"%(GoBoardUtil.int_to_color(color),c[0],c[1])
-            return True, msg
+            a_stones = self._stones.pop(a)
+            a_libs = self._libs.pop(a)
+            merged.append((a, a_stones, a_libs))
+            for s in a_stones:
+                self._anchor[s] = anchor
+            stones.extend(a_stones)
+            added_libs.extend(a_libs - libs)
+            libs |= a_libs
+        stones.append(point)
+        self._anchor[point] = anchor
+        added_libs.extend(new_libs - libs)
+        libs |= new_libs
+        libs.discard(point)
+        change = (point, opp_blocks, anchor, merged, old_len, added_libs)
+        self._update_legal(self._affected_points(change))
+        return change
+
+
+    def _remove_stone(self, change):
+        """
+        Take back a stone put down by _place_stone and restore the blocks around it.
+        Arguments
+        ---------
+        change: tuple
+            the value returned by _place_stone
+        """
+        point, opp_blocks, anchor, merged, old_len, added_libs = change
+        color = self.board[point]
+        self._stone_hash ^= ZOBRIST[color][point]
+        self._bits[color] &= ~(1 << point)
+        self._stone_count[color] -= 1
+        self.board[point] = EMPTY
+        self._anchor[point] = None
+        self._empty_index[point] = len(self._empty_points)
+        self._empty_points.append(point)
+        for a in opp_blocks:
+            self._libs[a].add(point)
+        if merged is None:
+            del self._stones[point]
+            del self._libs[point]
         else:
-            # undoing the move because of being suicidal
-            self.board[point] = EMPTY
-            if cap_inds!= None:
-                self.board[cap_inds]=GoBoardUtil.opponent(color)
-            c=self._point_to_coord(point)
-            #msg = "%s %d %d suicide"%(GoBoardUtil.int_to_color(color), c[0],c[1])  # suicide message. doesnt get displayed, but correct format - kaleb
-            msg = "suicide"
+            del self._stones[anchor][old_len:]
+            libs = self._libs[anchor]
+            libs.difference_update(added_libs)
+            libs.add(point)
+            for a, a_stones, a_libs in merged:
+                for s in a_stones:
+                    self._anchor[s] = a
+                self._stones[a] = a_stones
+                self._libs[a] = a_libs
+        self._update_legal(self._affected_points(change))
+
+
+    def _affected_points(self, change):
+        """
+        Points whose legality can change when the stone of change is put down or taken back:
+        the point, its neighbors and the liberties of every block whose liberties changed.
+        Arguments
+        ---------
+        change: tuple
+            the value returned by _place_stone
+
+        Returns
+        -------
+        points : set of int
+        """
+        point, opp_blocks, anchor, merged, _, _ = change
+        points = {point}
+        points.update(self._neighbors(point))
+        for a in opp_blocks:
+            points |= self._libs[a]
+        if self._anchor[point] is None:
+            # the stone has been taken back, the merged blocks are separate again
+            if merged is not None:
+                for a, _, a_libs in merged:
+                    points |= a_libs
+                points |= self._libs[anchor]
+        else:
+            points |= self._libs[anchor]
+        return points
+
+
+    def _update_legal(self, points):
+        """
+        Recheck the legality of the given points for both colors
+        Arguments
+        ---------
+        points : iterable of int
+        """
+        legal_black = self._legal[BLACK]
+        legal_white = self._legal[WHITE]
+        for p in points:
+            if self.board[p] != EMPTY:
+                legal_black.discard(p)
+                legal_white.discard(p)
+                continue
+            if self._is_legal(p, BLACK):
+                legal_black.add(p)
+            else:
+                legal_black.discard(p)
+            if self._is_legal(p, WHITE):
+                legal_white.add(p)
+            else:
+                legal_white.discard(p)
+
+
+    def get_legal_moves(self, color):
+        """
+        Argumnets:
+            color
+        This function returns the legal moves of color under the NoGo rules.
+        It reads the incrementally maintained legal move set, no point is checked,
+        or asks the bitboard engine when use_bitboard is set.
+        Return:
+            list of points
+        """
+        if self.use_bitboard:
+            return self._bitboard.legal_moves(self, color)
+        return sorted(self._legal[color])
+
+
+    def has_legal_move(self, color):
+        """
+        Whether color has any legal move, i.e. the game is not over with color to move.
+        The legal move sets are rechecked only around each changed point, so this
+        only looks at the size of the set of color and never scans the board.
+        Arguments
+        ---------
+        color
+
+        Return
+        ---------
+        bool
+        """
+        return len(self._legal[color]) > 0
+
+
+    def random_legal_move(self, color, rng=random):
+        """
+        Draw a legal move of color uniformly at random.
+        Empty points are drawn uniformly and rejected with the local _is_legal test;
+        since every legal point is equally likely to be accepted, the result is
+        uniform over the legal moves. When too many draws are rejected (a nearly full
+        board) the legal move set is scanned instead.
+        Arguments
+        ---------
+        color
+        rng : random.Random or the random module
+            source of the draws
+
+        Return
+        ---------
+        point, or None if color has no legal move
+        """
+        empty_points = self._empty_points
+        n = len(empty_points)
+        if n:
+            for _ in range(RANDOM_MOVE_TRIES):
+                point = empty_points[int(rng.random()*n)]
+                if self._is_legal(point, color):
+                    return point
+        legal = self._legal[color]
+        if not legal:
+            return None
+        return rng.choice(tuple(legal))
+
+
+    def play_undoable(self, point, color):
+        """
+        Play a move that can be taken back with undo.
+        Only the changed points and the move metadata are pushed on the undo stack,
+        the board is never copied.
+        Arguments
+        ---------
+        point, color
+
+        Return
+        ---------
+        bool:
+            whether the move was legal and has been played
+        """
+        if not self._is_legal(point, color):
+            return False
+        meta = (self.ko_constraint, self.passes_black, self.passes_white,
+                self.last_played_color, self.winner, self._is_empty)
+        self._undo_stack.append((self._place_stone(point, color), meta))
+        self._is_empty = False
+        self.ko_constraint = None
+        self.last_played_color = color
+        return True
+
+
+    def undo(self):
+        """
+        Take back the last move played with play_undoable
+        """
+        change, meta = self._undo_stack.pop()
+        self._remove_stone(change)
+        (self.ko_constraint, self.passes_black, self.passes_white,
+         self.last_played_color, self.winner, self._is_empty) = meta
+
+
+    def _play_move(self,point, color):
+        """
+        This function is for playing the move
+        Arguments
+        ---------
+        point, color
+
+        Return
+        ---------
+        State of move and appropriate message for that move
+        """
+        result, msg = self._check_move(point, color)
+        if not result:
             return False, msg
+        self._place_stone(point, color)
+        self._is_empty = False
+        self.caps = []
+        # no stones are ever captured in NoGo, so there is never a ko
+        self.ko_constraint = None
+        return True, msg
 
 
 
@@ -558,14 +911,11 @@ class GoBoard(object):
 
         Returns
         -------
-        points : list of int
+        points : tuple of int
             coordinate of points which are neighbors of the given point
+            (precomputed in the shared geometry)
         """
-        #row,col = self._point_to_coord(point)
-        #if 0 <= row <= self.size+1 and 0 <= col <= self.size+1:
-        return [point-1, point+1, point-self.NS, point+self.NS]
-        #else:
-        #    raise ValueError("This point is out of range!")
+        return self.geometry.neighbors[point]
 
 
     def _diag_neighbors(self,point):
@@ -577,15 +927,11 @@ class GoBoard(object):
 
         Returns
         -------
-        points : list of int
+        points : tuple of int
             coordinate of points which are diagnoal neighbors of the given point
+            (precomputed in the shared geometry)
         """
-
-        #row,col = self._point_to_coord(point)
-        #if 0 <= row <= self.size+1 and 0 <= col <= self.size+1:
-        return [point-self.NS-1, point-self.NS+1, point+self.NS-1, point+self.NS+1]
-        #else:
-        #    raise ValueError("This point is out of range!")
+        return self.geometry.diag_neighbors[point]
 
 
     def _border_removal(self,points):
@@ -677,8 +1023,7 @@ class GoBoard(object):
         """
         if point is None:
             return 'pass'
-        row, col = divmod(point, self.NS)
-        return row,col
+        return self.geometry.coords[point]
 
 
 # made these as a a bit of a hack for error outputs but didnt work. coord_to_position is still used somewhere and returns the position, eg a1 instead of an int - kaleb
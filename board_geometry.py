@@ -0,0 +1,73 @@
+"""
+Geometry tables of a board size, computed once and shared by every board of
+that size.
+
+Everything here depends only on the size, so GoBoard.reset and GoBoard.copy just
+attach the shared BoardGeometry instead of rebuilding lists on every call:
+    neighbors[point]      : the 4 neighbors of point (west, east, south, north)
+    diag_neighbors[point] : the 4 diagonal neighbors of point
+    points                : the on-board points, in get_all_positions order
+    coords[point]         : (row, col) of point
+    names[point]          : GTP vertex of an on-board point (e.g. 'c3'), None elsewhere
+    name_to_point         : GTP vertex (lower case) -> point
+    name_rank[point]      : position of names[point] when the vertices are sorted as strings,
+                            the order legal_moves answers in
+    neighbor_array        : neighbors as a (maxpoint, 4) numpy array for vectorized code
+The tables are tuples or read-only arrays, and the object has no __dict__,
+so it cannot be changed by accident.
+"""
+
+import numpy as np
+
+COLUMN_LETTERS = "abcdefghjklmnopqrstuvwxyz"
+
+
+class BoardGeometry(object):
+    __slots__ = ("size", "NS", "maxpoint", "neighbors", "diag_neighbors", "points",
+                 "coords", "names", "name_to_point", "name_rank", "neighbor_array", "point_array")
+
+    _cache = {}
+
+    @staticmethod
+    def for_size(size):
+        """ Return the shared geometry of a board size """
+        geometry = BoardGeometry._cache.get(size)
+        if geometry is None:
+            geometry = BoardGeometry(size)
+            BoardGeometry._cache[size] = geometry
+        return geometry
+
+    def __init__(self, size):
+        """
+        Build the tables of a board size; use for_size to get the shared instance.
+
+        Arguments
+        ---------
+        size : int
+            size of the board
+        """
+        NS = size + 1
+        maxpoint = size*size + 3*NS
+        self.size = size
+        self.NS = NS
+        self.maxpoint = maxpoint
+        self.neighbors = tuple((p-1, p+1, p-NS, p+NS) for p in range(maxpoint))
+        self.diag_neighbors = tuple((p-NS-1, p-NS+1, p+NS-1, p+NS+1) for p in range(maxpoint))
+        self.points = tuple(NS*x + y for y in range(1, size+1) for x in range(1, size+1))
+        self.coords = tuple(divmod(p, NS) for p in range(maxpoint))
+        names = [None]*maxpoint
+        for p in self.points:
+            row, col = self.coords[p]
+            names[p] = COLUMN_LETTERS[col-1] + str(row)
+        self.names = tuple(names)
+        self.name_to_point = {names[p]: p for p in self.points}
+        name_rank = [len(self.points)]*maxpoint
+        for rank, name in enumerate(sorted(self.name_to_point)):
+            name_rank[self.name_to_point[name]] = rank
+        self.name_rank = tuple(name_rank)
+        neighbor_array = np.array(self.neighbors, dtype=np.intp)
+        neighbor_array.setflags(write=False)
+        self.neighbor_array = neighbor_array
+        point_array = np.array(sorted(self.points), dtype=np.intp)
+        point_array.setflags(write=False)
+        self.point_array = point_array
@@ -3,13 +3,15 @@ BLACK = 1
 WHITE = 2
 BORDER = 3
 FLOODFILL = 4
-import numpy as np
+from engine_stats import STATS
+from position_cache import POSITION_CACHE
 
 class GoBoardUtil(object):
     
     @staticmethod       
     def play(komi,board,color,limit=None):
         twopass=2
+        played = 0
         if limit:
             for i in range(limit):
                 while twopass:
@@ -18,6 +20,7 @@ class GoBoardUtil(object):
                         if not (board.move(move,color)):
                             raise ValueError("Move given by GoBoardUtil is not valid!")
                         twopass = 2
+                        played += 1
                     else:
                         twopass -= 1
                     color = GoBoardUtil.opponent(color)
@@ -28,9 +31,12 @@ class GoBoardUtil(object):
                     if not (board.move(move,color)):
                         raise ValueError("Move given by GoBoardUtil is not valid!")
                     twopass = 2
+                    played += 1
                 else:
                     twopass -= 1
                 color = GoBoardUtil.opponent(color)
+        if STATS.enabled:
+            STATS.playout(played)
         winner = board.get_winner(komi)
         return winner
     
@@ -46,23 +52,8 @@ class GoBoardUtil(object):
         color : {'b','w'}
             the color to generate the move for.
         """
-        moves = board.get_empty_positions(color)
-        num_moves = len(moves)
-        np.random.shuffle(moves)
-        illegal_moves = []
-
-        for i in range(num_moves):
-            if board.check_legal(moves[i],color):
-                continue
-            else:
-                illegal_moves.append(i)
-        legal_moves = np.delete(moves,illegal_moves)
-        gtp_moves=[]
-        for point in legal_moves:
-            x,y = board._point_to_coord(point)
-            gtp_moves.append(GoBoardUtil.format_point((x,y)))
-        sorted_moves = ' '.join(sorted(gtp_moves))
-        return sorted_moves
+        # answered from the position cache; formatted once per position
+        return POSITION_CACHE.legal_response(board, color)
             
     @staticmethod       
     def generate_random_move(board, color):
@@ -76,25 +67,14 @@ class GoBoardUtil(object):
         color : {'b','w'}
             the color to generate the move for.
         """
-        moves = board.get_empty_positions(color)
-        num_moves = len(moves)
-        np.random.shuffle(moves)
-        move = None
-        for i in range(num_moves):
-            if board.check_legal(moves[i],color):
-                move = moves[i]
-                old_liberty= board._liberty(move,color)
-                # Moving this to random player
-                sboard = np.array(board.board, copy=True)
-                # swap out true board for simulation board, and try to play the move
-                result = board.move(move, color)                
-                new_liberty= board._liberty(move,color)
-                # reset true board
-                board.board = sboard
-                if new_liberty==1 and old_liberty!=new_liberty and not result:
-                    continue
-                break
-        return move
+        # The old loop shuffled the empty points and took the first legal one after a
+        # self-atari filter: it played the move with board.move on the real board
+        # (restoring a saved copy afterwards) and skipped it only if it left one
+        # liberty *and* board.move had failed. board.move never fails on a move
+        # check_legal accepted, so nothing was ever skipped and the move was uniform
+        # over the legal moves; random_legal_move draws from the same distribution
+        # without copying or shuffling anything.
+        return board.random_legal_move(color)
     
     @staticmethod
     def format_point(move):
@@ -201,8 +181,11 @@ class GoBoardUtil(object):
     @staticmethod
     def copyb2b(board,copy_board):
         """Return an independent copy of this Board."""
-        copy_board.board = np.copy(board.board)
+        copy_board.backend = board.backend
+        copy_board.backend_name = board.backend_name
+        copy_board.board = board.backend.copy(board.board)
         copy_board.suicide = board.suicide  # checking for suicide move
+        copy_board.use_bitboard = board.use_bitboard
         copy_board.winner = board.winner 
         copy_board.NS = board.NS
         copy_board.WE = board.WE
@@ -210,8 +193,11 @@ class GoBoardUtil(object):
         copy_board.passes_black = board.passes_black
         copy_board.passes_white = board.passes_white
         copy_board.current_player = board.current_player
+        copy_board.last_played_color = board.last_played_color
         copy_board.ko_constraint =  board.ko_constraint 
         copy_board.white_captures = board.white_captures
         copy_board.black_captures = board.black_captures 
+        board._copy_incremental_state(copy_board)
+        copy_board._undo_stack = []
 
         
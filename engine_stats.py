@@ -0,0 +1,171 @@
+"""
+Counters of the engine's hot paths.
+
+STATS counts
+    flood_fills            : BitBoard.flood calls, the block expansions of the bitboard
+                             backend and of the tablebase generator (the other boards
+                             keep their blocks incrementally and do no flood fill)
+    copies                 : GoBoard.copy and GoBoardUtil.copyb2b calls
+    legality_checks        : check_legal and _check_move calls
+    local_legality_checks  : _is_legal calls (including the ones behind check_legal,
+                             the incremental legal move sets and the random move sampler)
+    playouts, playout_moves: finished random playouts and the moves played in them
+and the number of calls and the seconds spent per GTP command.
+
+When the counters are off nothing is added to the hot paths: enable() replaces
+the counted methods by counting wrappers and disable() puts the originals back.
+Playouts and GTP commands are counted by the code that runs them, behind a single
+check of STATS.enabled per playout or command.
+"""
+
+import functools
+import importlib
+import json
+import threading
+import time
+
+# (module, class, method, counter) of every wrapped method; the classes are looked up
+# in enable, so board, board_util and bitboard can import this module
+_COUNTED = (
+    ("bitboard", "BitBoard", "flood", "flood_fills"),
+    ("board", "GoBoard", "copy", "copies"),
+    ("board_util", "GoBoardUtil", "copyb2b", "copies"),
+    ("board", "GoBoard", "check_legal", "legality_checks"),
+    ("board", "GoBoard", "_check_move", "legality_checks"),
+    ("board", "GoBoard", "_is_legal", "local_legality_checks"),
+)
+
+
+class EngineStats(object):
+
+    def __init__(self):
+        self.enabled = False
+        self._originals = []
+        self._dump_thread = None
+        self._dump_stop = threading.Event()
+        # the counting wrappers hold on to this dict, reset only clears it
+        self.counts = {}
+        self.reset()
+
+    def reset(self):
+        """ Set every counter back to 0 """
+        for name in ("flood_fills", "copies", "legality_checks", "local_legality_checks",
+                     "playouts", "playout_moves"):
+            self.counts[name] = 0
+        # command name -> [calls, seconds]
+        self.commands = {}
+        self.started = time.time()
+
+    def _counting(self, function, counter):
+        counts = self.counts
+
+        @functools.wraps(function)
+        def counted(*args, **kwargs):
+            counts[counter] += 1
+            return function(*args, **kwargs)
+        return counted
+
+    def enable(self):
+        """ Start counting """
+        if self.enabled:
+            return
+        for module, class_name, name, counter in _COUNTED:
+            cls = getattr(importlib.import_module(module), class_name)
+            original = cls.__dict__[name]
+            if isinstance(original, staticmethod):
+                wrapped = staticmethod(self._counting(original.__func__, counter))
+            else:
+                wrapped = self._counting(original, counter)
+            self._originals.append((cls, name, original))
+            setattr(cls, name, wrapped)
+        self.enabled = True
+
+    def disable(self):
+        """ Stop counting and restore the uninstrumented methods """
+        if not self.enabled:
+            return
+        self.enabled = False
+        for cls, name, original in reversed(self._originals):
+            setattr(cls, name, original)
+        self._originals = []
+
+    def playout(self, length):
+        """ Count a finished playout of length moves """
+        self.counts["playouts"] += 1
+        self.counts["playout_moves"] += length
+
+    def playouts(self, number, moves):
+        """ Count number finished playouts with moves moves in total """
+        self.counts["playouts"] += number
+        self.counts["playout_moves"] += moves
+
+    def command(self, name, seconds):
+        """ Count a GTP command that took seconds """
+        entry = self.commands.get(name)
+        if entry is None:
+            entry = self.commands[name] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def snapshot(self):
+        """
+        Returns
+        -------
+        dict of the counters, the average playout length and the per command times
+        """
+        result = dict(self.counts)
+        playouts = result["playouts"]
+        result["avg_playout_length"] = result["playout_moves"] / playouts if playouts else 0.0
+        result["commands"] = {name: {"calls": calls, "seconds": seconds, "avg_ms": 1000.0*seconds/calls}
+                              for name, (calls, seconds) in self.commands.items()}
+        result["enabled"] = self.enabled
+        result["uptime"] = time.time() - self.started
+        return result
+
+    def format(self):
+        """ The snapshot as 'name value' lines, as the engine_stats GTP command shows it """
+        snapshot = self.snapshot()
+        lines = []
+        for name in sorted(snapshot):
+            if name == "commands":
+                continue
+            value = snapshot[name]
+            lines.append("%s %s" % (name, "%.3f" % value if isinstance(value, float) else value))
+        for name in sorted(snapshot["commands"]):
+            entry = snapshot["commands"][name]
+            lines.append("command %s calls %d seconds %.3f avg_ms %.3f"
+                         % (name, entry["calls"], entry["seconds"], entry["avg_ms"]))
+        return "\n".join(lines)
+
+    def start_dump(self, path, interval=10.0):
+        """
+        Append a JSON line with the snapshot to path every interval seconds,
+        from a background thread, until stop_dump
+        """
+        self.stop_dump()
+        self._dump_stop.clear()
+        self._dump_thread = threading.Thread(target=self._dump, args=(path, interval),
+                                             name="engine-stats", daemon=True)
+        self._dump_thread.start()
+
+    def stop_dump(self):
+        """ Stop the periodic dump, writing one last line """
+        if self._dump_thread is None:
+            return
+        self._dump_stop.set()
+        self._dump_thread.join()
+        self._dump_thread = None
+
+    def _dump(self, path, interval):
+        with open(path, "a") as f:
+            while True:
+                stopped = self._dump_stop.wait(interval)
+                snapshot = self.snapshot()
+                snapshot["time"] = time.time()
+                f.write(json.dumps(snapshot, sort_keys=True) + "\n")
+                f.flush()
+                if stopped:
+                    return
+
+
+STATS = EngineStats()
@@ -6,8 +6,16 @@ by Isaac Henrion and Aamos Storkey at the University of Edinburgh.
 """
 import traceback
 import sys
+import time
+import threading
 import os
 from board import GoBoard
+from time_control import TimeManager
+from board_backend import BACKENDS
+from gtp_log import GtpLog
+from engine_stats import STATS
+from position_cache import POSITION_CACHE
+from solver import NoGoSolver
 from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, FLOODFILL
 import numpy as np
 import re
@@ -15,7 +23,9 @@ import re
 
 class GtpConnection():
 
-    def __init__(self, go_engine,outfile = '/tmp/gtp_log', debug_mode = False):
+    def __init__(self, go_engine,outfile = '/tmp/gtp_log', debug_mode = False, time_margin = 0.1, backend = None,
+                 log_max_bytes = 0, log_backups = 0, outstream = None, solve_empty_points = 12, solve_time = 1.0,
+                 tablebases = ()):
         #ugly outfile, doesn't work in windows environment
         """
         object that plays Go using GTP
@@ -28,17 +38,42 @@ class GtpConnection():
             komi used for the current game
         board: GoBoard
             SIZExSIZE array representing the current board state
+        time_margin : float
+            seconds kept back from every move under time control
+        backend : str or None
+            storage backend of the board, see board_backend
+        outfile : str or None
+            copy of the GTP stream, written by a background thread; None disables it
+        log_max_bytes, log_backups : int
+            size cap and number of rotated files of the log, see gtp_log
+        outstream : file-like or None
+            where the responses go, sys.stdout if None; every connection
+            writes to its own stream so several can run in one process
+        solve_empty_points : int
+            genmove tries the exact solver when at most this many points are empty (0:
+            never), for engines whose solve_endgame attribute is true
+        solve_time : float
+            seconds the solver gets in genmove when there is no time control, and
+            the default limit of the solve command
+        tablebases : iterable of tablebase.Tablebase
+            perfect play tables; genmove, solve and tablebase use the one of the board size
         """
-        mode='w'
-        self.stdout = sys.stdout
+        self.stdout = sys.stdout if outstream is None else outstream
         #sys.stdout = outfile
         self._debug_mode = debug_mode
-        self.file = open(outfile, mode)
+        self.log = GtpLog(outfile, max_bytes=log_max_bytes, backup_count=log_backups)
         #self.stderr = sys.stderr
-        sys.stdout = self
+        # the engine may ponder in a background thread; keep writes whole
+        self._write_lock = threading.Lock()
         self.go_engine = go_engine
         self.komi = 0
-        self.board = GoBoard(3) #TODO: chang default size back to 7
+        self.board = GoBoard(3, backend) #TODO: chang default size back to 7
+        self.vertex_to_point = self.board.geometry.name_to_point
+        self.time_manager = TimeManager(safety_margin=time_margin)
+        self.solver = NoGoSolver()
+        self.solve_empty_points = solve_empty_points
+        self.solve_time = solve_time
+        self.tablebases = {tablebase.size: tablebase for tablebase in tablebases}
         self.commands = {
             "protocol_version": self.protocol_version_cmd,
             "quit": self.quit_cmd,
@@ -54,9 +89,21 @@ class GtpConnection():
             "list_commands": self.list_commands_cmd,
             "play": self.play_cmd,
             "final_score": self.final_score_cmd,
-            "legal_moves": self.legal_moves_cmd
+            "legal_moves": self.legal_moves_cmd,
+            "time_settings": self.time_settings_cmd,
+            "time_left": self.time_left_cmd,
+            "board_backend": self.board_backend_cmd,
+            "engine_stats": self.engine_stats_cmd,
+            "solve": self.solve_cmd,
+            "tablebase": self.tablebase_cmd,
+            "tablebase_moves": self.tablebase_moves_cmd
         }
 
+        # commands that neither change the game nor need the engine, pondering goes on through them
+        self.ponder_safe = {"protocol_version", "name", "version", "known_command",
+                            "list_commands", "showboard", "legal_moves", "final_score",
+                            "time_left", "engine_stats", "tablebase", "tablebase_moves"}
+
         # used for argument checking
         # values: (required number or arguments, error message on argnum failure)
         self.argmap = {
@@ -65,6 +112,9 @@ class GtpConnection():
             "known_command": (1, 'Usage: known_command CMD_NAME'),
             "set_free_handicap": (1, 'Usage: set_free_handicap MOVE (e.g. A4)'),
             "genmove": (1, 'Usage: genmove {w,b}'),
+            "time_settings": (3, 'Usage: time_settings MAIN_TIME BYO_YOMI_TIME BYO_YOMI_STONES'),
+            "time_left": (3, 'Usage: time_left {w,b} TIME STONES'),
+            "board_backend": (1, 'Usage: board_backend {auto,numpy,compact,bitboard}'),
             #"play": (2, 'Usage: play {b,w} MOVE'),  --> original
 
             #"play": (2, ' wrong number of arguments'), # changed to make it clearer what error its referring to, -Kaleb
@@ -76,16 +126,17 @@ class GtpConnection():
         }
     
     def __del__(self):
-        sys.stdout = self.stdout
-        self.file.close()
+        self.log.close()
 
     def write(self, data):
-        self.file.write(data)
-        self.stdout.write(data) 
+        with self._write_lock:
+            self.stdout.write(data) 
+            self.log.write(data)
 
     def flush(self,):
-        self.stdout.flush()
-        self.file.flush()
+        # only the GTP stream; the log thread flushes the file after every batch
+        with self._write_lock:
+            self.stdout.flush()
 
     def start_connection(self):
         """
@@ -97,6 +148,7 @@ class GtpConnection():
         while line:
             self.get_cmd(line)
             line = sys.stdin.readline()
+        self.log.close()
 
     def get_cmd(self, command):
         """
@@ -123,17 +175,23 @@ class GtpConnection():
             # player_errors(2, None, None, args) # this necessary? -adam
             # sys.stdout.flush()
             return
+        if command_name not in self.ponder_safe:
+            self.stop_pondering()
         if command_name in self.commands:
+            started = time.time() if STATS.enabled else None
             try:
                 self.commands[command_name](args)
             except Exception as e:
                 self.debug_msg("Error executing command {}\n".format(str(e)))
                 self.debug_msg("Stack Trace:\n{}\n".format(traceback.format_exc()))
                 raise e
+            finally:
+                if started is not None:
+                    STATS.command(command_name, time.time() - started)
         else:
             self.debug_msg("Unknown command: {}\n".format(command_name))
             self.error('Unknown command')
-            sys.stdout.flush()
+            self.flush()
 
     def arg_error(self, cmd, argnum):
         """
@@ -163,7 +221,7 @@ class GtpConnection():
 
     def error(self, error_msg=''):
         """ Send error msg to stdout and through the GTP connection. """
-        sys.stdout.write('? {}\n\n'.format(error_msg)); sys.stdout.flush()
+        self.write('? {}\n\n'.format(error_msg)); self.flush()
         # sys.stdout.write('illegal move')
         # original sys.stdout.write('illegal move: [input]  {}\n\n'.format(error_msg)); sys.stdout.flush()
         # sys.stdout.write('illegal move: '+elements[0]+' {}\n\n'.format(error_msg))
@@ -171,7 +229,7 @@ class GtpConnection():
     def respond(self, response=''):
         """ Send msg to stdout """
         #sys.stdout.write("worrrrrrrrdddddddddsssss")
-        sys.stdout.write('= {}\n\n'.format(response)); sys.stdout.flush()
+        self.write('= {}\n\n'.format(response)); self.flush()
 
     def reset(self, size):
         """
@@ -183,6 +241,29 @@ class GtpConnection():
             the boardsize to reinitialize the state to
         """
         self.board.reset(size)
+        # GTP vertex -> point, shared by every board of this size
+        self.vertex_to_point = self.board.geometry.name_to_point
+        self.time_manager.new_game()
+        if hasattr(self.go_engine, "reset"):
+            self.go_engine.reset()
+
+    def stop_pondering(self):
+        """ Stop the engine's background search, if it has one """
+        if hasattr(self.go_engine, "stop_pondering"):
+            self.go_engine.stop_pondering()
+
+    def engine_played(self, point, color):
+        """
+        Tell the engine that a move has been played on the board, so it can
+        keep what it knows about the new position (e.g. a search subtree)
+
+        Arguments
+        ---------
+        point : int
+        color : {BLACK, WHITE}
+        """
+        if hasattr(self.go_engine, "played"):
+            self.go_engine.played(self.board, point, color)
 
     def protocol_version_cmd(self, args):
         """ Return the GTP protocol version being used (always 2) """
@@ -190,7 +271,9 @@ class GtpConnection():
 
     def quit_cmd(self, args):
         """ Quit game and exit the GTP interface """
+        self.stop_pondering()
         self.respond()
+        self.log.close()
         exit()
 
     def name_cmd(self, args):
@@ -218,6 +301,48 @@ class GtpConnection():
         self.reset(int(args[0]))
         self.respond()
 
+    def engine_stats_cmd(self, args):
+        """
+        Show the hot path counters (see engine_stats) and the position cache counters
+
+        Arguments
+        ---------
+        args[0] : {'on','off','reset'}, optional
+            start or stop counting, or set the counters back to 0
+        """
+        if args:
+            action = args[0].lower()
+            if action == "on":
+                STATS.enable()
+            elif action == "off":
+                STATS.disable()
+            elif action == "reset":
+                STATS.reset()
+            else:
+                self.error('Usage: engine_stats [on|off|reset]')
+                return
+        cache = POSITION_CACHE.stats()
+        cache_lines = ["cache_%s %s" % (name, "%.3f" % value if isinstance(value, float) else value)
+                       for name, value in sorted(cache.items())]
+        self.respond('\n' + STATS.format() + '\n' + '\n'.join(cache_lines))
+
+    def board_backend_cmd(self, args):
+        """
+        Select the storage backend of the board and clear the board
+
+        Arguments
+        ---------
+        args[0] : {'auto','numpy','compact','bitboard'}
+            backend name, 'auto' chooses by board size
+        """
+        name = args[0].lower()
+        if name != "auto" and name not in BACKENDS:
+            self.error('unknown backend')
+            return
+        self.board.backend_name = None if name == "auto" else name
+        self.reset(self.board.size)
+        self.respond()
+
     def showboard_cmd(self, args):
         self.respond('\n' + str(self.board.get_twoD_board()))
 
@@ -350,49 +475,15 @@ class GtpConnection():
                     return
             ####end error checking code -adam
             ####start error checking code -adam
-            #get all the moves to test it the args are suitable, then send off to other error checking for more specific checks -adam
-            points_list = self.board.get_all_positions()
-            moves_list = []
-            for thing in points_list:
-                thing = self.board._point_to_coord(thing)
-                thing = GoBoardUtil.format_point(thing)
-                thing.lower()
-                moves_list.append(thing)
-            #print(moves_list)
-            if args[1].lower() not in moves_list: #testing strings pls
+            # the vertex table of the board size maps every on-board vertex (lower case) to its point,
+            # so anything not in it (pass, off the board, garbage) is a wrong coordinate
+            move = self.vertex_to_point.get(args[1].lower())
+            if move is None:
                 self.respond("illegal move: %s %s wrong coordinate"%(args[0], args[1]))
                 return
             board_color = args[0].lower()
-            ####start error checking code -adam
-            check_coor, msg = GoBoardUtil.move_to_coord(args[1],self.board.size) #this is kinda broken, but its hacked to work for now. check_coor doesn't do anything
-            if msg == "bounds": 
-                self.respond("illegal move: %s %s wrong coordinate"%(args[0], args[1]))
-                # self.respond() -og
-                return
             board_move = args[1]
-            # self.respond("2") remove -not sure what this is -adam
             color= GoBoardUtil.color_to_int(board_color)
-            #player_errors(3, 2, args[1], args) #TODO: here. '2' to try and force it to work 
-            #TODO: hi need to fix the pass as passing isn't allowed - adam
-            #print("pass check")
-            # okay so the pass should be taken care of by the wrong number of args, wrong color and wrong coordinate checks.
-            """
-            if args[1].lower()=='pass': #note this may have been showing NoneType comparison -adam
-                #self.debug_msg("Player {} is passing\n".format(args[0]))
-                #self.respond()
-                 #self.respond("game over, no passing allowed scrub")
-                print("kaleb here with another fantastic print statement for args[0]: ", args[0]) 
-                self.respond("illegal move: %s no passing"%(args[0]))
-                return
-                """
-            move = GoBoardUtil.move_to_coord(args[1], self.board.size)
-            if move:
-                move = self.board._coord_to_point(move[0],move[1])
-            # move == None on pass
-            else:
-                #not sure what this does -adam
-                self.error("Error in executing the move %s, check given move: %s"%(move,args[1]))
-                return
             ####trying idea for error handling here -adam
             #if not self.board.move(move, color):
             #    # self.respond("Illegal Move: {}".format(board_move), msg)
@@ -404,9 +495,10 @@ class GtpConnection():
                 self.respond("Illegal Move: {}".format(board_move))
                 return
             else:
+                self.engine_played(move, color)
                 self.debug_msg("Move: {}\nBoard:\n{}\n".format(board_move, str(self.board.get_twoD_board())))
             #next 2 lines are for determining if end game state
-            if GoBoardUtil.generate_random_move(self.board, GoBoardUtil.opponent(color)) == None:
+            if not self.board.has_legal_move(GoBoardUtil.opponent(color)):
                 self.final_score_cmd([])
                 #seems to always work, be it human players or ai (so far) -adam
             self.respond()
@@ -428,6 +520,192 @@ class GtpConnection():
         self.respond()
         #quit()
 
+    def time_settings_cmd(self, args):
+        """
+        Set the time control of the game
+
+        Arguments
+        ---------
+        args[0] : float
+            main time in seconds
+        args[1] : float
+            byo-yomi time in seconds
+        args[2] : int
+            stones per byo-yomi period
+        """
+        try:
+            self.time_manager.time_settings(float(args[0]), float(args[1]), int(args[2]))
+            self.respond()
+        except ValueError:
+            self.error('syntax error')
+
+    def time_left_cmd(self, args):
+        """
+        Update the clock of a player
+
+        Arguments
+        ---------
+        args[0] : {'b','w'}
+            the color whose clock is given
+        args[1] : float
+            seconds left
+        args[2] : int
+            stones left in the byo-yomi period, 0 in main time
+        """
+        try:
+            color = GoBoardUtil.color_to_int(args[0].lower())
+            self.time_manager.set_time_left(color, float(args[1]), int(args[2]))
+            self.respond()
+        except ValueError:
+            self.error('syntax error')
+
+    def tablebase_move(self, color):
+        """
+        The perfect play move of color from the tablebase of the board size: the
+        fastest win or the slowest loss; None if the position is not in a table
+        """
+        tablebase = self.tablebases.get(self.board.size)
+        if tablebase is None:
+            return None
+        result = tablebase.best_move(self.board, color)
+        if result is None:
+            return None
+        win, distance, move = result
+        self.debug_msg("tablebase: win {} distance {} move {}\n".format(win, distance, move))
+        return move
+
+    def _color_to_move(self, args, usage):
+        """
+        The color given in args[0], the opponent of the last mover by default;
+        None after reporting usage if args[0] is not a color
+        """
+        if args:
+            board_color = args[0].lower()
+            if board_color not in ('b', 'w'):
+                self.error(usage)
+                return None
+            return GoBoardUtil.color_to_int(board_color)
+        if self.board.last_played_color is None:
+            return BLACK
+        return GoBoardUtil.opponent(self.board.last_played_color)
+
+    def solved_move(self, color, deadline=None):
+        """
+        A proven winning move of color when few enough points are empty to solve the
+        position within the move budget, None otherwise (or if color loses anyway)
+
+        Arguments
+        ---------
+        color : {BLACK, WHITE}
+        deadline : float or None
+            time.time() by which the move is due
+        """
+        if not getattr(self.go_engine, "solve_endgame", False):
+            return None
+        if len(self.board._empty_points) > self.solve_empty_points:
+            return None
+        time_limit = self.solve_time
+        if deadline is not None:
+            # leave half of the budget to the engine in case the solver gives up
+            time_limit = min(time_limit, max(0.0, deadline - time.time()) / 2)
+        winner, move = self.solver.solve(self.board, color, time_limit=time_limit)
+        self.debug_msg("solver: winner {} move {} nodes {}\n".format(winner, move, self.solver.nodes))
+        return move if winner == color else None
+
+    def solve_cmd(self, args):
+        """
+        Solve the current position exactly
+
+        Arguments
+        ---------
+        args[0] : {'b','w'}, optional
+            the color to move, the opponent of the last mover by default
+        args[1] : float, optional
+            seconds before giving up, solve_time by default
+
+        Responds with the winner and, if it is the color to move, a winning move
+        (e.g. "b a1" or "w"), or "unknown" if the time ran out
+        """
+        color = self._color_to_move(args, 'Usage: solve [b|w] [seconds]')
+        if color is None:
+            return
+        try:
+            # never unbounded: a stdin session or a server worker would be stuck
+            time_limit = float(args[1]) if len(args) > 1 else self.solve_time
+        except ValueError:
+            self.error('Usage: solve [b|w] [seconds]')
+            return
+        tablebase = self.tablebases.get(self.board.size)
+        result = tablebase.best_move(self.board, color) if tablebase is not None else None
+        if result is not None:
+            win, _, move = result
+            winner = color if win else GoBoardUtil.opponent(color)
+            if not win:
+                move = None
+        else:
+            winner, move = self.solver.solve(self.board, color, time_limit=time_limit)
+        if winner is None:
+            self.respond("unknown")
+        elif move is None:
+            self.respond(GoBoardUtil.int_to_color(winner))
+        else:
+            self.respond("{} {}".format(GoBoardUtil.int_to_color(winner), self.board.geometry.names[move]))
+
+    def tablebase_cmd(self, args):
+        """
+        Look the current position up in the tablebase of the board size
+
+        Arguments
+        ---------
+        args[0] : {'b','w'}, optional
+            the color to move, the opponent of the last mover by default
+
+        Responds with "win" or "loss" for the color to move, the number of moves
+        left with perfect play and the perfect play move if there is one (e.g.
+        "win 5 b2" or "loss 0"), or "unknown" if the position is not in a table
+        """
+        color = self._color_to_move(args, 'Usage: tablebase [b|w]')
+        if color is None:
+            return
+        tablebase = self.tablebases.get(self.board.size)
+        result = tablebase.best_move(self.board, color) if tablebase is not None else None
+        if result is None:
+            self.respond("unknown")
+            return
+        win, distance, move = result
+        answer = "{} {}".format("win" if win else "loss", distance)
+        if move is not None:
+            answer += " " + self.board.geometry.names[move]
+        self.respond(answer)
+
+    def tablebase_moves_cmd(self, args):
+        """
+        The legal moves of a color with their perfect play values from the tablebase
+        of the board size; legal_moves itself keeps its plain answer, which
+        regression scripts and GUIs parse
+
+        Arguments
+        ---------
+        args[0] : {'b','w'}, optional
+            the color to move, the opponent of the last mover by default
+
+        Responds with every legal move, in the order of legal_moves, followed by
+        "win" or "loss" for the color and the moves left with perfect play after
+        it (e.g. "a1 loss 6 b1 win 3"), or "unknown" if the position is not in a table
+        """
+        color = self._color_to_move(args, 'Usage: tablebase_moves [b|w]')
+        if color is None:
+            return
+        tablebase = self.tablebases.get(self.board.size)
+        values = tablebase.move_values(self.board, color) if tablebase is not None else None
+        if values is None:
+            self.respond("unknown")
+            return
+        geometry = self.board.geometry
+        values.sort(key=lambda value: geometry.name_rank[value[0]])
+        self.respond(' '.join(["{} {} {}".format(geometry.names[move], "win" if win else "loss", distance)
+                               for move, win, distance in values]))
+
     def genmove_cmd(self, args):
         """
         generate a move for the specified color
@@ -440,12 +718,22 @@ class GtpConnection():
             color : {0,1}
             board_color : {'b','w'}
         """
+        start = time.time()
         try:
             board_color = args[0].lower()
             color = GoBoardUtil.color_to_int(board_color)
             self.debug_msg("Board:\n{}\nko: {}\n".format(str(self.board.get_twoD_board()),
                                                           self.board.ko_constraint))
-            move = self.go_engine.get_move(self.board, color)
+            deadline = self.time_manager.move_deadline(self.board, color, start)
+            # near the end of the game a proven win beats the engine's guess
+            move = self.tablebase_move(color)
+            if move is None:
+                move = self.solved_move(color, deadline)
+            if move is None:
+                if deadline is not None and getattr(self.go_engine, "anytime", False):
+                    move = self.go_engine.get_move(self.board, color, deadline=deadline)
+                else:
+                    move = self.go_engine.get_move(self.board, color)
             if move is None:
             # a bit of a hack here, as like a "secondary" check if the random ai goes rogue and tries a pass move. -adam
                 self.respond("Computer tried to pass. No passing allowed.")
@@ -462,13 +750,18 @@ class GtpConnection():
             # move is legal; play it
             self.debug_msg("Color: " + board_color + " ")
             self.board.move(move,color)
+            self.engine_played(move, color)
             self.debug_msg("Move: {}\nBoard: \n{}\n".format(move, str(self.board.get_twoD_board())))
             move = self.board._point_to_coord(move)
             board_move = GoBoardUtil.format_point(move)
+            self.time_manager.used(color, time.time() - start)
             self.respond(board_move)
             #the next 2 lines determine if game state is over -adam
-            if GoBoardUtil.generate_random_move(self.board, GoBoardUtil.opponent(color)) == None:
+            if not self.board.has_legal_move(GoBoardUtil.opponent(color)):
                 self.final_score_cmd([])
+            elif hasattr(self.go_engine, "start_pondering"):
+                # think on the opponent's time until the next command
+                self.go_engine.start_pondering(self.board, GoBoardUtil.opponent(color))
         except Exception as e:
             self.respond('Error: {}'.format(str(e)))
 
@@ -0,0 +1,115 @@
+"""
+Log sink for the GTP connection.
+
+Everything written to the GTP stream is also copied to a log file. Writing and
+flushing that file on every response costs more than some commands, so the
+connection only puts the text on a bounded queue and a background thread writes
+it out in batches:
+    - the GTP stream itself is still written and flushed right away
+    - when the queue is full the text is dropped (and counted) instead of
+      making the engine wait for the disk
+    - max_bytes caps the size of the file; with backup_count > 0 a full file is
+      rotated to path.1, path.2, ... otherwise it is started again
+    - a GtpLog without a path is disabled and does nothing
+"""
+
+import os
+import queue
+import threading
+
+
+class GtpLog(object):
+
+    def __init__(self, path, max_bytes=0, backup_count=0, queue_size=10000, batch_size=256):
+        """
+        Arguments
+        ---------
+        path : str or None
+            log file, None disables logging
+        max_bytes : int
+            largest size of the log file, 0 for no limit
+        backup_count : int
+            number of rotated files kept when max_bytes is reached
+        queue_size : int
+            largest number of writes waiting for the writer thread
+        batch_size : int
+            largest number of writes joined into one file write
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        if path is None:
+            return
+        self._file = open(path, 'w')
+        self._size = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._writer, name="gtp-log", daemon=True)
+        self._thread.start()
+
+    @property
+    def enabled(self):
+        return self._queue is not None
+
+    def write(self, data):
+        """ Queue data for the log file; never waits for the disk """
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """ Write out everything queued so far and close the file """
+        if self._queue is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._queue = None
+        self._thread = None
+
+    def _writer(self):
+        """ Body of the writer thread: drain the queue in batches until close """
+        q = self._queue
+        while True:
+            batch = [q.get()]
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            done = batch[-1] is None
+            if done:
+                batch.pop()
+            if batch:
+                self._write_out(''.join(batch))
+            if done:
+                self._file.close()
+                return
+
+    def _write_out(self, text):
+        while self.max_bytes and self._size + len(text) > self.max_bytes:
+            # fill the file up to the cap and carry on in a new one
+            room = self.max_bytes - self._size
+            self._file.write(text[:room])
+            text = text[room:]
+            self._rotate()
+        self._file.write(text)
+        self._file.flush()
+        self._size += len(text)
+
+    def _rotate(self):
+        """ Start a new log file, keeping backup_count old ones """
+        self._file.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                older = "%s.%d" % (self.path, i)
+                if os.path.exists(older):
+                    os.replace(older, "%s.%d" % (self.path, i + 1))
+            os.replace(self.path, self.path + ".1")
+        self._file = open(self.path, 'w')
+        self._size = 0
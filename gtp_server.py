@@ -0,0 +1,138 @@
+"""
+GTP server: many GTP sessions in one process, over TCP or a Unix socket.
+
+Every accepted connection is a session with its own GtpConnection, and so its
+own GoBoard, komi, clock and engine; commands are dispatched exactly as on
+stdin. The responses of a session are written to a buffer of that session and
+sent back on its socket after each command, never through sys.stdout.
+
+The event loop only reads and writes sockets. Commands that can take long
+(genmove, legal_moves and solve by default) run on a thread pool so that one
+long search does not hold up the other sessions; the commands of one session
+still run one at a time, in order.
+"""
+
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from gtp_connection import GtpConnection
+
+
+class GtpServer(object):
+
+    def __init__(self, engine_factory, workers=None, heavy_commands=("genmove", "legal_moves", "solve"),
+                 **connection_args):
+        """
+        Arguments
+        ---------
+        engine_factory : callable
+            returns a new engine (e.g. RandomPlayer) for every session
+        workers : int or None
+            threads running the heavy commands, default of ThreadPoolExecutor if None
+        heavy_commands : iterable of str
+            commands run on the worker threads instead of the event loop
+        connection_args :
+            passed on to every GtpConnection (backend, time_margin, ...); the
+            log is off unless outfile is given
+        """
+        self.engine_factory = engine_factory
+        self.heavy_commands = frozenset(heavy_commands)
+        connection_args.setdefault("outfile", None)
+        self.connection_args = connection_args
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.sessions = 0
+
+    def new_session(self, outstream):
+        """ Return the GtpConnection of a new session writing to outstream """
+        return GtpConnection(self.engine_factory(), outstream=outstream, **self.connection_args)
+
+    def _command_name(self, line):
+        elements = line.split()
+        # regression scripts number their commands
+        if elements and elements[0].isdigit():
+            elements = elements[1:]
+        return elements[0] if elements else None
+
+    def _run_command(self, session, line):
+        """
+        Run one command of a session
+
+        Returns
+        -------
+        False if the session asked to quit
+        """
+        try:
+            session.get_cmd(line)
+        except SystemExit:
+            return False
+        except Exception as e:
+            # get_cmd has already sent the stack trace to the debug stream
+            session.error(str(e))
+        return True
+
+    async def handle(self, reader, writer):
+        """ Serve one connection until it quits or closes """
+        loop = asyncio.get_running_loop()
+        out = io.StringIO()
+        session = self.new_session(out)
+        self.sessions += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8", errors="replace")
+                if self._command_name(line) in self.heavy_commands:
+                    go_on = await loop.run_in_executor(self.executor, self._run_command, session, line)
+                else:
+                    go_on = self._run_command(session, line)
+                response = out.getvalue()
+                out.seek(0)
+                out.truncate()
+                if response:
+                    writer.write(response.encode("utf-8"))
+                    await writer.drain()
+                if not go_on:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            session.stop_pondering()
+            session.log.close()
+            writer.close()
+
+    async def serve_tcp(self, host, port):
+        """ Accept sessions on a TCP port until cancelled """
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_unix(self, path):
+        """ Accept sessions on a Unix socket until cancelled """
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self.handle, path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def run(self, host="127.0.0.1", port=None, path=None):
+        """
+        Serve on a TCP port or, if path is given, on a Unix socket until interrupted
+        """
+        if path is not None:
+            main = self.serve_unix(path)
+        else:
+            main = self.serve_tcp(host, port)
+        try:
+            asyncio.run(main)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.executor.shutdown(wait=False)
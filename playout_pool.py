@@ -0,0 +1,224 @@
+"""
+Process pool for win-rate estimation with random playouts.
+
+The playouts of one request are split into chunks and fanned out over a set of
+long-lived worker processes. Every chunk gets its own child of a numpy
+SeedSequence, so the random streams of the workers never overlap, and each
+worker keeps its BatchPlayout engines between requests, so a genmove does not pay
+for the numpy import and the board setup again.
+
+A request has either a playout budget or a deadline; with a deadline, every
+worker is kept busy with chunks, a new chunk being sent only if it is expected to
+finish before the deadline (from the time the last chunks of that board size
+took). The chunks still running are waited for and merged, so no stale work is
+left to hold up the next request.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+from batch_playout import BatchPlayout
+
+# BatchPlayout engines of a worker process, by board size
+_engines = {}
+
+
+def _init_worker(sizes):
+    """ Runs once in every worker process: build the engines of sizes ahead of the first request """
+    _engines.clear()
+    for size in sizes:
+        _engine(size)
+
+
+def _started():
+    return os.getpid()
+
+
+def _engine(size):
+    engine = _engines.get(size)
+    if engine is None:
+        engine = BatchPlayout(size)
+        _engines[size] = engine
+    return engine
+
+
+def _run_chunk(size, board, color, num_playouts, seed):
+    """
+    Play a chunk of playouts in a worker.
+
+    Arguments
+    ---------
+    size : int
+    board : (maxpoint,) int8 array
+        snapshot of GoBoard.board
+    color : int
+        side to move
+    num_playouts : int
+    seed : numpy.random.SeedSequence
+
+    Returns
+    -------
+    first moves, wins of color and number of playouts for each first move, as arrays
+    """
+    engine = _engine(size)
+    boards = np.tile(board, (num_playouts, 1))
+    winners, moves, lengths = engine.play(boards, np.full(num_playouts, color, dtype=np.int8),
+                                          np.random.default_rng(seed))
+    played = lengths > 0
+    first = moves[played, 0]
+    won = winners[played] == color
+    points, inverse = np.unique(first, return_inverse=True)
+    wins = np.bincount(inverse, weights=won, minlength=len(points))
+    counts = np.bincount(inverse, minlength=len(points))
+    return points, wins, counts
+
+
+class PlayoutPool(object):
+
+    def __init__(self, num_workers=None, seed=None, chunk_size=500, sizes=(7,), deadline_chunk_size=50):
+        """
+        Start the worker processes.
+
+        Arguments
+        ---------
+        num_workers : int, optional
+            number of worker processes, the number of cores by default
+        seed : int, optional
+            root seed of the random streams
+        chunk_size : int
+            largest number of playouts sent to a worker at once
+        sizes : tuple of int
+            board sizes whose engines every worker builds when it starts
+        deadline_chunk_size : int
+            playouts per chunk when a request has a deadline; small chunks waste
+            little work when time runs out
+        """
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.deadline_chunk_size = deadline_chunk_size
+        self._seeds = np.random.SeedSequence(seed)
+        # players of several GTP sessions may share the pool
+        self._seed_lock = threading.Lock()
+        # seconds a deadline chunk took, by board size
+        self._chunk_seconds = {}
+        self._executor = ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_worker,
+                                             initargs=(tuple(sizes),))
+        # start the workers now rather than on the first request
+        self._executor.submit(_started).result()
+
+    def _spawn(self, n):
+        with self._seed_lock:
+            return self._seeds.spawn(n)
+
+    @staticmethod
+    def _merge(stats, result):
+        points, wins, counts = result
+        for point, w, c in zip(points.tolist(), wins.tolist(), counts.tolist()):
+            old_w, old_c = stats.get(point, (0, 0))
+            stats[point] = (old_w + w, old_c + c)
+
+    @staticmethod
+    def _collect(stats, result, on_result):
+        if on_result is not None:
+            chunk = {}
+            PlayoutPool._merge(chunk, result)
+            on_result(chunk)
+        PlayoutPool._merge(stats, result)
+
+    def evaluate(self, board, color, num_playouts=None, deadline=None, on_result=None):
+        """
+        Estimate the value of every first move of color with random playouts.
+
+        Arguments
+        ---------
+        board : GoBoard
+            position to evaluate, left untouched
+        color : {BLACK, WHITE}
+            side to move
+        num_playouts : int, optional
+            total playout budget
+        deadline : float, optional
+            time.time() at which to stop when no budget is given
+        on_result : callable, optional
+            called with the stats of every chunk as soon as it is in (e.g. to
+            feed a search that runs meanwhile)
+
+        Returns
+        -------
+        stats : dict
+            point -> (wins of color, playouts) for every first move that was tried
+        """
+        snapshot = np.asarray(board.board, dtype=np.int8)
+        if num_playouts is None:
+            if deadline is None:
+                raise ValueError("evaluate needs a playout budget or a deadline")
+            return self._evaluate_until(board.size, snapshot, color, deadline, on_result)
+        chunks = []
+        remaining = num_playouts
+        per_worker = -(-num_playouts // self.num_workers)
+        chunk = max(1, min(self.chunk_size, per_worker))
+        while remaining > 0:
+            chunks.append(min(chunk, remaining))
+            remaining -= chunk
+        seeds = self._spawn(len(chunks))
+        futures = [self._executor.submit(_run_chunk, board.size, snapshot, color, n, s)
+                   for n, s in zip(chunks, seeds)]
+        stats = {}
+        for future in futures:
+            PlayoutPool._collect(stats, future.result(), on_result)
+        return stats
+
+    def _evaluate_until(self, size, snapshot, color, deadline, on_result=None):
+        """
+        Keep one chunk per worker in flight while chunks are expected to finish
+        before deadline, then wait for the last ones
+        """
+        stats = {}
+        # future -> time it was sent
+        pending = {}
+        while True:
+            now = time.time()
+            # the first chunks of a size are sent blind; they show how long one takes
+            expected = self._chunk_seconds.get(size, 0.0)
+            free = self.num_workers - len(pending)
+            if free > 0 and now + expected < deadline:
+                for seed in self._spawn(free):
+                    future = self._executor.submit(_run_chunk, size, snapshot, color,
+                                                   self.deadline_chunk_size, seed)
+                    pending[future] = now
+            if not pending:
+                return stats
+            done, _ = wait(pending, timeout=max(0.0, deadline - now), return_when=FIRST_COMPLETED)
+            if not done and time.time() >= deadline:
+                # past the deadline: finish what is running rather than leave it queued
+                done, _ = wait(pending)
+            finished = time.time()
+            for future in done:
+                sent = pending.pop(future)
+                seconds = finished - sent
+                # cautious estimate: up at once to a slower chunk, down slowly
+                self._chunk_seconds[size] = max(seconds, 0.75*self._chunk_seconds.get(size, seconds) + 0.25*seconds)
+                PlayoutPool._collect(stats, future.result(), on_result)
+
+    def best_move(self, board, color, num_playouts):
+        """
+        Return the first move with the best win rate, or None if color cannot move
+        """
+        stats = self.evaluate(board, color, num_playouts)
+        if not stats:
+            return None
+        return max(stats, key=lambda p: stats[p][0] / stats[p][1])
+
+    def close(self):
+        """ Stop the worker processes """
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
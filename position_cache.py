@@ -0,0 +1,192 @@
+"""
+LRU cache of per-position results.
+
+Front-ends and regression scripts ask for the legal moves of the same positions
+again and again. A position is identified by its Zobrist hash (see
+GoBoard.hash) together with the board size, the ko point and the color to move,
+so the key is computed without looking at the board. Each entry keeps
+    legal       : the legal moves, as a sorted tuple of points
+    responses   : the legal_moves GTP responses, built the first time they are asked
+                  for, by orientation (see below)
+    evaluations : optional values stored by name (e.g. a search or solver result)
+With symmetric=True all 8 rotations and mirror images of a position share one
+entry, keyed by the canonical orientation of the stones (see symmetry.Symmetry).
+The legal moves are then stored in the canonical orientation and mapped back to
+the board asking for them, so only values that do not depend on the orientation
+(win rates, solved results, not moves) should be stored as evaluations.
+The least recently used entries are dropped when the cache is full; hits, misses
+and evictions are counted so the size can be chosen from real runs.
+POSITION_CACHE is the cache shared by the GTP connections in a process.
+"""
+
+import threading
+from collections import OrderedDict
+
+from symmetry import Symmetry
+
+DEFAULT_MAX_ENTRIES = 100000
+
+
+class CacheEntry(object):
+    __slots__ = ("legal", "responses", "evaluations")
+
+    def __init__(self, legal):
+        self.legal = legal
+        self.responses = None
+        self.evaluations = None
+
+
+class PositionCache(object):
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, symmetric=False):
+        """
+        Arguments
+        ---------
+        max_entries : int
+            largest number of positions kept, 0 disables the cache
+        symmetric : bool
+            share one entry between the 8 symmetric orientations of a position
+        """
+        self.max_entries = max_entries
+        self.symmetric = symmetric
+        self._entries = OrderedDict()
+        # GTP server sessions share the cache
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(board, color):
+        """ Cache key of the position on board with color to move """
+        return (board.size, board._stone_hash, board.ko_constraint, color)
+
+    @staticmethod
+    def symmetric_key(board, color):
+        """
+        Key shared by the 8 orientations of the position, and the transform from
+        board to the canonical orientation
+        """
+        symmetry = Symmetry.for_size(board.size)
+        stones, t = symmetry.canonical_key(board)
+        ko = board.ko_constraint
+        if ko is not None:
+            ko = symmetry.transform_point(ko, t)
+        return (board.size, stones, ko, color), t
+
+    def _lookup(self, board, color):
+        """
+        Returns
+        -------
+        (entry, t): the entry of the position, added if it was not cached, and the
+        transform from board to the orientation of the entry (0 unless symmetric)
+        """
+        if self.max_entries <= 0:
+            return CacheEntry(tuple(board.get_legal_moves(color))), 0
+        if self.symmetric:
+            key, t = PositionCache.symmetric_key(board, color)
+        else:
+            key, t = PositionCache.key(board, color), 0
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry, t
+            self.misses += 1
+        legal = board.get_legal_moves(color)
+        if t:
+            forward = Symmetry.for_size(board.size).forward[t]
+            legal = sorted([int(forward[move]) for move in legal])
+        entry = CacheEntry(tuple(legal))
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry, t
+
+    def entry(self, board, color):
+        """
+        Return the entry of a position, adding it if it is not cached
+
+        Arguments
+        ---------
+        board : GoBoard
+        color : {BLACK, WHITE}
+
+        Returns
+        -------
+        CacheEntry; with symmetric=True its legal moves may be those of a rotation
+        or mirror image of board, use legal_moves to get the moves on board
+        """
+        return self._lookup(board, color)[0]
+
+    def legal_moves(self, board, color):
+        """ Legal moves of color on board as a sorted tuple of points """
+        entry, t = self._lookup(board, color)
+        if not t:
+            return entry.legal
+        inverse = Symmetry.for_size(board.size).inverse[t]
+        return tuple(sorted([int(inverse[move]) for move in entry.legal]))
+
+    def legal_response(self, board, color):
+        """ Legal moves of color as GTP vertices in string order, as legal_moves answers """
+        entry, t = self._lookup(board, color)
+        if entry.responses is None:
+            entry.responses = {}
+        response = entry.responses.get(t)
+        if response is None:
+            legal = entry.legal
+            if t:
+                inverse = Symmetry.for_size(board.size).inverse[t]
+                legal = [int(inverse[move]) for move in legal]
+            # the vertex names and their string order are precomputed per board size
+            geometry = board.geometry
+            names = geometry.names
+            legal = sorted(legal, key=geometry.name_rank.__getitem__)
+            response = ' '.join([names[point] for point in legal])
+            entry.responses[t] = response
+        return response
+
+    def evaluation(self, board, color, name, default=None):
+        """ Value stored with set_evaluation for the position, default if none """
+        entry = self.entry(board, color)
+        if entry.evaluations is None:
+            return default
+        return entry.evaluations.get(name, default)
+
+    def set_evaluation(self, board, color, name, value):
+        """ Store a named value (e.g. a win rate) with the position """
+        entry = self.entry(board, color)
+        if entry.evaluations is None:
+            entry.evaluations = {}
+        entry.evaluations[name] = value
+
+    def resize(self, max_entries):
+        """ Change the size of the cache, dropping the oldest entries if needed """
+        with self._lock:
+            self.max_entries = max_entries
+            while len(self._entries) > max(max_entries, 0):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """ Drop every entry and reset the counters """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict with entries, max_entries, hits, misses, evictions and hit_rate
+        """
+        lookups = self.hits + self.misses
+        return {"entries": len(self._entries), "max_entries": self.max_entries,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+POSITION_CACHE = PositionCache()
@@ -0,0 +1,301 @@
+#!/usr/bin/python3
+"""
+In-process GTP regression runner, a stand-in for gogui-regress.
+
+A regression file is a list of GTP commands; a numbered command followed by a
+line
+    #? [expected]
+is a test. expected is a regular expression the whole response must match,
+[!expected] inverts the test and a * after the brackets marks a known failure.
+Like in gogui-regress a test is counted as
+    FAIL : unexpected failure        fail : known failure
+    PASS : known failure that passed pass : expected pass
+and Error counts tests whose command answered with a GTP error ("? ...").
+
+Every file gets its own GtpConnection (and so its own board and engine), the
+files are run on a pool of worker processes (threads with --threads), and the
+totals are written in the column format of gogui's summary.dat, with the wall
+and CPU seconds spent on each file.
+
+With --parity every file is replayed once per board backend instead, the random
+generators seeded the same way each time, and every response, not only the
+tests, must be the same under all backends.
+"""
+
+import argparse
+import io
+import random
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+from board_backend import BACKENDS
+from gtp_connection import GtpConnection
+from tablebase import Tablebase
+
+COLUMNS = ("Tests", "FAIL", "fail", "PASS", "pass", "Error", "Time", "CpuTime")
+
+_EXPECTED = re.compile(r"^#\?\s*\[(.*)\](\*?)")
+_COMMAND_ID = re.compile(r"^(\d+)\s+(.*)$")
+
+
+def parse_file(path):
+    """
+    Read a regression file
+
+    Arguments
+    ---------
+    path : str
+
+    Returns
+    -------
+    list of [id, command, expected, known_failure]; expected is None for a
+    command that is not a test, id is the command number or the line number
+    """
+    commands = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] == '#':
+                match = _EXPECTED.match(line)
+                if match and commands:
+                    commands[-1][2] = match.group(1)
+                    commands[-1][3] = match.group(2) == "*"
+                continue
+            match = _COMMAND_ID.match(line)
+            if match:
+                commands.append([int(match.group(1)), match.group(2), None, False])
+            else:
+                commands.append([number, line, None, False])
+    return commands
+
+
+def _first_response(output):
+    """
+    Split the output of one command into (ok, text) of its first response; some
+    commands (e.g. a move that ends the game) send a second one, which is ignored
+    """
+    if not output:
+        return False, ""
+    ok = output[0] == '='
+    text = output[1:].split("\n\n", 1)[0]
+    return ok, text.strip()
+
+
+def _passed(expected, text):
+    negate = expected.startswith("!")
+    if negate:
+        expected = expected[1:]
+    try:
+        matched = re.fullmatch(expected, text) is not None
+    except re.error:
+        matched = expected == text
+    return matched != negate
+
+
+def new_engine(player):
+    """ Engine used for the regression sessions """
+    # Go1 builds the players; imported here so this module does not need it to load
+    from Go1 import RandomPlayer, UctPlayer
+    if player == "uct":
+        return UctPlayer(num_playouts=200)
+    return RandomPlayer()
+
+
+def _responses(path, player, backend, tablebase_paths=()):
+    """
+    Play the commands of a regression file in a new GTP session, with the
+    tablebases of tablebase_paths loaded
+
+    Yields
+    ------
+    (id, command, expected, known_failure, ok, text) for every command
+    """
+    out = io.StringIO()
+    tablebases = [Tablebase(p) for p in tablebase_paths]
+    session = GtpConnection(new_engine(player), outfile=None, backend=backend, outstream=out,
+                            tablebases=tablebases)
+    try:
+        for test_id, command, expected, known_failure in parse_file(path):
+            quit = False
+            try:
+                session.get_cmd(command + "\n")
+            except SystemExit:
+                quit = True
+            except Exception as e:
+                session.error(str(e))
+            ok, text = _first_response(out.getvalue())
+            out.seek(0)
+            out.truncate()
+            yield test_id, command, expected, known_failure, ok, text
+            if quit:
+                break
+    finally:
+        session.stop_pondering()
+        for tablebase in tablebases:
+            tablebase.close()
+
+
+def run_file(path, player="random", backend=None, tablebase_paths=()):
+    """
+    Run a regression file in a new GTP session
+
+    Returns
+    -------
+    dict with the counts of COLUMNS, "file" and "failures", a list of
+    (id, command, expected, response) of the tests that did not pass as expected
+    """
+    start = time.time()
+    cpu_start = time.thread_time()
+    result = {c: 0 for c in COLUMNS}
+    result["file"] = path
+    result["failures"] = []
+    for test_id, command, expected, known_failure, ok, text in _responses(path, player, backend, tablebase_paths):
+        if expected is None:
+            continue
+        result["Tests"] += 1
+        passed = ok and _passed(expected, text)
+        if not ok:
+            result["Error"] += 1
+        if known_failure:
+            result["PASS" if passed else "fail"] += 1
+        else:
+            result["pass" if passed else "FAIL"] += 1
+        if passed == known_failure:
+            result["failures"].append((test_id, command, expected, ("= " if ok else "? ") + text))
+    result["Time"] = time.time() - start
+    result["CpuTime"] = time.thread_time() - cpu_start
+    return result
+
+
+def replay_file(path, backend, player="random", seed=0):
+    """
+    Responses to every command of a regression file on one board backend
+
+    Returns
+    -------
+    list of (id, command, response); the random generators are seeded with seed
+    first, so genmove answers the same on every backend
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    return [(test_id, command, ("= " if ok else "? ") + text)
+            for test_id, command, _, _, ok, text in _responses(path, player, backend)]
+
+
+def parity_file(path, backends=None, player="random"):
+    """
+    Replay a regression file on every backend and compare with the first one
+
+    Returns
+    -------
+    list of (backend, id, command, response of the first backend, response)
+    for every command answered differently; empty if all backends agree
+    """
+    backends = sorted(BACKENDS) if backends is None else backends
+    reference = replay_file(path, backends[0], player)
+    differences = []
+    for backend in backends[1:]:
+        replay = replay_file(path, backend, player)
+        for (test_id, command, expected), (_, _, response) in zip(reference, replay):
+            if response != expected:
+                differences.append((backend, test_id, command, expected, response))
+        if len(replay) != len(reference):
+            differences.append((backend, None, "(end of file)", len(reference), len(replay)))
+    return differences
+
+
+def format_row(result):
+    """ One summary.dat line: the COLUMNS separated (and ended) by tabs """
+    fields = []
+    for c in COLUMNS:
+        if c in ("Time", "CpuTime"):
+            fields.append("%.3f" % result[c])
+        else:
+            fields.append(str(result[c]))
+    return "\t".join(fields) + "\t"
+
+
+def run(paths, workers=None, processes=True, player="random", backend=None, tablebase_paths=()):
+    """
+    Run regression files on a worker pool, one session per file
+
+    Arguments
+    ---------
+    paths : list of str
+    workers : int or None
+        size of the pool
+    processes : bool
+        use worker processes; the commands are CPU bound Python, so threads
+        (processes=False) take turns on the GIL and only save the process start
+    tablebase_paths : tuple of str
+        table files every session loads (see tablebase.py)
+
+    Returns
+    -------
+    (per file results in the order of paths, totals)
+    """
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    start = time.time()
+    cpu_start = time.process_time()
+    with pool(max_workers=workers) as executor:
+        results = list(executor.map(run_file, paths, [player]*len(paths), [backend]*len(paths),
+                                    [tuple(tablebase_paths)]*len(paths)))
+    totals = {c: sum(r[c] for r in results) for c in COLUMNS}
+    # the totals are what the run cost, not the sum over files running side by side
+    totals["Time"] = time.time() - start
+    totals["CpuTime"] = time.process_time() - cpu_start + (
+        sum(r["CpuTime"] for r in results) if processes else 0)
+    return results, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run GTP regression files in-process")
+    parser.add_argument("files", nargs="+", help="regression files (.gtp)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="size of the worker pool")
+    parser.add_argument("--threads", action="store_true",
+                        help="run the files on threads instead of worker processes (no parallel speedup)")
+    parser.add_argument("--player", choices=["random", "uct"], default="random")
+    parser.add_argument("--backend", choices=["auto", "numpy", "compact", "bitboard"], default="auto")
+    parser.add_argument("--tablebase", action="append", default=[], metavar="PATH",
+                        help="table file written by tablebase.py, loaded by every session (may be repeated)")
+    parser.add_argument("--summary", default=None, metavar="PATH",
+                        help="write the totals to PATH in the summary.dat format")
+    parser.add_argument("-v", "--verbose", action="store_true", help="list the tests that failed")
+    parser.add_argument("--parity", action="store_true",
+                        help="replay the files on every backend and report the responses that differ")
+    args = parser.parse_args()
+    if args.parity:
+        # the sessions of a file seed the random generators of their process, so
+        # two files must not run side by side in one process
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            reports = list(executor.map(parity_file, args.files, [None]*len(args.files),
+                                        [args.player]*len(args.files)))
+        for path, differences in zip(args.files, reports):
+            print("%s\t%s" % (path, "differs" if differences else "same"))
+            for backend, test_id, command, expected, response in differences:
+                print("#   %s %s:%s %s: [%s] vs [%s]" % (backend, path, test_id, command, expected, response))
+        return 1 if any(reports) else 0
+    backend = None if args.backend == "auto" else args.backend
+    results, totals = run(args.files, args.workers, not args.threads, args.player, backend, args.tablebase)
+    header = "#" + "\t".join(COLUMNS)
+    print("#File\t" + "\t".join(COLUMNS))
+    for r in results:
+        print(r["file"] + "\t" + format_row(r))
+        if args.verbose:
+            for test_id, command, expected, response in r["failures"]:
+                print("#   %s:%d %s: expected [%s], got [%s]" % (r["file"], test_id, command, expected, response))
+    print(header)
+    print(format_row(totals))
+    if args.summary:
+        with open(args.summary, "w") as f:
+            f.write(header + "\n" + format_row(totals) + "\n")
+    return 1 if totals["FAIL"] or totals["Error"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Exact NoGo solver.
+
+NoGo has no draws and the side to move with no legal move loses, so a position is
+a win for the side to move iff some legal move leads to a loss for the opponent.
+The solver is a negamax search over these two values, which makes alpha-beta a
+plain cutoff: the search of a position stops at the first move that wins.
+    - transposition table: proven values keyed like the position cache, by the
+      Zobrist hash of the stones, the ko point and the color to move
+    - move ordering: a move into a position already proven lost for the opponent is
+      taken at once (the child's key is the parent's hash with the Zobrist key of the
+      move, so this needs no move to be played). With many empty points the others
+      are tried by increasing (opponent's legal moves - own legal moves) after the
+      move; near the end, where playing every move first costs more than it saves,
+      contested points come first and points only the side to move can use last
+    - limits: a time and/or node limit; when one is hit the search gives up and the
+      result is unknown (the values proven so far stay in the table)
+    - symmetry (optional): the table is keyed by the canonical orientation of the
+      position, so a position and its 7 rotations and mirror images are solved once;
+      the winning move is stored in the canonical orientation. This costs a canonical
+      key per node and the child probe above, so it pays off when the search keeps
+      reaching symmetric positions (small boards, openings)
+"""
+
+import time
+
+from board import ZOBRIST
+from board_util import GoBoardUtil
+from position_cache import PositionCache
+from symmetry import Symmetry
+
+
+# above this many empty points, moves are ordered by the mobility after playing them
+MOBILITY_EMPTY_POINTS = 8
+
+
+class SolverLimit(Exception):
+    """ Raised inside the search when the time or node limit is reached """
+
+
+class NoGoSolver(object):
+
+    def __init__(self, max_entries=2000000, symmetric=False):
+        """
+        Arguments
+        ---------
+        max_entries : int
+            largest size of the transposition table; it is cleared when full
+        symmetric : bool
+            share the table entries of symmetric positions
+        """
+        self.max_entries = max_entries
+        self.symmetric = symmetric
+        # key -> (win for the side to move, winning move or None)
+        self.table = {}
+        self.nodes = 0
+        self._deadline = None
+        self._node_limit = None
+
+    @staticmethod
+    def key(board, color):
+        return (board.size, board._stone_hash, board.ko_constraint, color)
+
+    def solve(self, board, color, time_limit=None, node_limit=None):
+        """
+        Solve the position on board with color to move
+
+        Arguments
+        ---------
+        board : GoBoard
+            left untouched, the search runs on a copy
+        color : {BLACK, WHITE}
+        time_limit : float or None
+            seconds before giving up
+        node_limit : int or None
+            positions searched before giving up
+
+        Returns
+        -------
+        (winner, move): winner is BLACK or WHITE, or None if the limit was hit;
+        move is a winning move of color if color wins, None otherwise
+        """
+        self.nodes = 0
+        self._deadline = None if time_limit is None else time.time() + time_limit
+        self._node_limit = node_limit
+        if len(self.table) > self.max_entries:
+            self.table.clear()
+        try:
+            win, move = self._search(board.copy(), color)
+        except SolverLimit:
+            return None, None
+        if win:
+            return color, move
+        return GoBoardUtil.opponent(color), None
+
+    def _check_limits(self):
+        if self._node_limit is not None and self.nodes >= self._node_limit:
+            raise SolverLimit()
+        if self._deadline is not None and time.time() >= self._deadline:
+            raise SolverLimit()
+
+    def _search(self, board, color):
+        """
+        Returns
+        -------
+        (win, move) for color to move on board
+        """
+        if self.symmetric:
+            key, t = PositionCache.symmetric_key(board, color)
+        else:
+            key, t = NoGoSolver.key(board, color), 0
+        result = self.table.get(key)
+        if result is not None:
+            if t and result[1] is not None:
+                return result[0], Symmetry.for_size(board.size).untransform_point(result[1], t)
+            return result
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            self._check_limits()
+        opponent = GoBoardUtil.opponent(color)
+        table = self.table
+        keys = ZOBRIST[color]
+        stone_hash = board._stone_hash
+        opponent_legal = board._legal[opponent]
+        ordered = []
+        result = (False, None)
+        mobility = len(board._empty_points) > MOBILITY_EMPTY_POINTS
+        probe = not self.symmetric
+        for move in board.get_legal_moves(color):
+            # the key of the child is known without playing the move
+            child = probe and table.get((board.size, stone_hash ^ keys[move], None, opponent))
+            if child and not child[0]:
+                result = (True, move)
+                break
+            if mobility:
+                board.play_undoable(move, color)
+                ordered.append((len(board._legal[opponent]) - len(board._legal[color]), move))
+                board.undo()
+            else:
+                # contested points first: they also take a move away from the opponent,
+                # while a point only color can use stays available for later
+                ordered.append((move not in opponent_legal, move))
+        else:
+            ordered.sort()
+            for _, move in ordered:
+                board.play_undoable(move, color)
+                opponent_wins, _ = self._search(board, opponent)
+                board.undo()
+                if not opponent_wins:
+                    result = (True, move)
+                    break
+        if t and result[1] is not None:
+            table[key] = (True, Symmetry.for_size(board.size).transform_point(result[1], t))
+        else:
+            table[key] = result
+        return result
@@ -0,0 +1,155 @@
+"""
+The 8 symmetries of the square board (4 rotations, each with or without a mirror).
+
+A position and its rotations and mirror images have the same value and the same
+legal moves up to the symmetry, so anything cached by position can be stored once
+for all 8 of them by keying it on the canonical orientation: the orientation whose
+on-board points, read in get_all_positions order, give the smallest sequence of
+colors.
+
+Symmetry.for_size(size) holds permutation tables of the padded 1-D layout:
+    forward[t][p] : where point p goes under transform t
+    inverse[t][q] : the point that transform t sends to q
+Border points are left where they are. A move is taken to the canonical
+orientation with forward[t][move] and back with inverse[t][move].
+canonical_key is the fast path for one GoBoard, canonical_batch the vectorized
+one for a (B, maxpoint) array of boards.
+"""
+
+from operator import itemgetter
+
+import numpy as np
+from board_geometry import BoardGeometry
+
+# base-3 digits packed into one int64 by canonical_batch (3**39 < 2**63)
+_DIGITS_PER_WORD = 39
+
+
+class Symmetry(object):
+
+    _cache = {}
+
+    @staticmethod
+    def for_size(size):
+        """ Return the (shared) symmetry tables of a board size """
+        symmetry = Symmetry._cache.get(size)
+        if symmetry is None:
+            symmetry = Symmetry(size)
+            Symmetry._cache[size] = symmetry
+        return symmetry
+
+    def __init__(self, size):
+        """
+        Build the permutation tables of a board size
+
+        Arguments
+        ---------
+        size : int
+            size of the board
+        """
+        geometry = BoardGeometry.for_size(size)
+        NS = geometry.NS
+        last = size - 1
+        self.size = size
+        self.points = geometry.points
+        forward = np.tile(np.arange(geometry.maxpoint, dtype=np.intp), (8, 1))
+        for t in range(8):
+            for p in geometry.points:
+                row, col = divmod(p, NS)
+                i, j = row - 1, col - 1
+                for _ in range(t % 4):
+                    i, j = j, last - i
+                if t >= 4:
+                    j = last - j
+                forward[t, p] = NS*(i+1) + (j+1)
+        inverse = np.empty_like(forward)
+        for t in range(8):
+            inverse[t, forward[t]] = np.arange(geometry.maxpoint, dtype=np.intp)
+        forward.setflags(write=False)
+        inverse.setflags(write=False)
+        self.forward = forward
+        self.inverse = inverse
+        # for every transform, the colors of the transformed board in points order
+        self._readers = tuple(itemgetter(*[int(inverse[t, q]) for q in geometry.points]) for t in range(8))
+        self._point_array = np.array(geometry.points, dtype=np.intp)
+
+    def transform_point(self, point, t):
+        """ The point that point goes to under transform t """
+        return int(self.forward[t, point])
+
+    def untransform_point(self, point, t):
+        """ The point that transform t sends to point """
+        return int(self.inverse[t, point])
+
+    def transform_boards(self, boards, t):
+        """
+        Apply transform t to one board or a batch of boards in the padded layout
+
+        Arguments
+        ---------
+        boards : (..., maxpoint) array
+        t : int or (B,) int array
+            one transform for all boards or one per board
+
+        Returns
+        -------
+        the transformed boards, a new array
+        """
+        boards = np.asarray(boards)
+        return np.take_along_axis(boards, np.broadcast_to(self.inverse[t], boards.shape), axis=-1)
+
+    def canonical_key(self, board):
+        """
+        Canonical orientation of a GoBoard
+
+        Arguments
+        ---------
+        board : GoBoard
+
+        Returns
+        -------
+        (key, t): key is the same for all 8 orientations of the position (a
+        tuple of the colors of the canonical orientation), t is the transform
+        from board to the canonical orientation
+        """
+        cells = board.board
+        best = None
+        best_t = 0
+        for t, read in enumerate(self._readers):
+            key = read(cells)
+            if best is None or key < best:
+                best = key
+                best_t = t
+        return best, best_t
+
+    def canonical_batch(self, boards):
+        """
+        Canonical orientation of every board of a batch
+
+        Arguments
+        ---------
+        boards : (B, maxpoint) int array
+
+        Returns
+        -------
+        (canonical, transforms): the (B, maxpoint) boards in canonical
+        orientation and the (B,) transforms that took each board there
+        """
+        boards = np.asarray(boards)
+        num = boards.shape[0]
+        # colors of all 8 orientations in points order, shape (B, 8, N)
+        oriented = boards[:, self.inverse[:, self._point_array]].astype(np.int64)
+        # pack base-3 digits into words, most significant first, so that comparing
+        # the words in order compares the orientations lexicographically
+        n = oriented.shape[2]
+        words = []
+        for start in range(0, n, _DIGITS_PER_WORD):
+            chunk = oriented[:, :, start:start + _DIGITS_PER_WORD]
+            powers = 3 ** np.arange(chunk.shape[2] - 1, -1, -1, dtype=np.int64)
+            words.append((chunk * powers).sum(axis=2))
+        candidates = np.ones((num, 8), dtype=bool)
+        for word in words:
+            masked = np.where(candidates, word, np.iinfo(np.int64).max)
+            candidates &= masked == masked.min(axis=1, keepdims=True)
+        transforms = np.argmax(candidates, axis=1)
+        return self.transform_boards(boards, transforms), transforms
@@ -0,0 +1,278 @@
+#!/usr/bin/python3
+"""
+Retrograde endgame tablebase for small NoGo boards.
+
+On 3x3 and 4x4 every position reachable from the empty board can be listed, so
+the value of each of them under perfect play is computed once, offline:
+    1. forward: the positions are generated layer by layer from the empty board,
+       layer k holding the positions with k stones; Black is to move on the even
+       layers and White on the odd ones,
+    2. backward: from the last layer to the first, a position where the side to
+       move has no legal move is lost at distance 0; any other is won if some move
+       leads to a lost position (at 1 + the shortest such distance) and lost
+       otherwise (at 1 + the longest distance of its moves, the loser holding out).
+Distances count moves until the side to move has no legal move.
+
+The table file is a 16 byte header (magic, board size, number of positions) and
+one byte per position, at the ternary index of the position: the sum over the
+on-board points, taken in get_all_positions order, of color * 3**i. A byte is
+    0                    : not a reachable position with that side to move
+    WIN | distance       : won by the side to move
+    LOSS | distance      : lost by the side to move
+The side to move is not stored; it follows from the stone counts (Black when
+they are equal, White when Black has one stone more), and any other position is
+unknown. Tablebase opens the file with mmap, so a probe is one byte read and the
+OS pages the table in as it is used instead of loading it at startup.
+
+    python tablebase.py --size 4 --output nogo4.tb
+    python Go1.py --tablebase nogo4.tb
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from operator import itemgetter
+
+import numpy as np
+from bitboard import BitBoard
+from board_geometry import BoardGeometry
+from board_util import BLACK, WHITE
+
+MAGIC = b"NOGOTB1\0"
+# magic, board size, number of positions
+HEADER = struct.Struct("<8sII")
+WIN = 0x80
+LOSS = 0x40
+DISTANCE = 0x3f
+# 3**25 bytes for 5x5 is out of reach
+MAX_SIZE = 4
+
+
+def color_to_move(black_stones, white_stones):
+    """ The side to move of a position reached by alternating moves, None if there is none """
+    if black_stones == white_stones:
+        return BLACK
+    if black_stones == white_stones + 1:
+        return WHITE
+    return None
+
+
+class Tablebase(object):
+
+    def __init__(self, path):
+        """
+        Map a table file written by generate
+
+        Arguments
+        ---------
+        path : str
+        """
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, size, positions = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or not 0 < size <= MAX_SIZE or len(self._map) != HEADER.size + 3 ** (size * size):
+            self._map.close()
+            raise ValueError("{} is not a NoGo tablebase".format(path))
+        self.path = path
+        self.size = size
+        self.positions = positions
+        points = BoardGeometry.for_size(size).points
+        self._read_points = itemgetter(*points)
+        # offset of a point's digit in the index
+        self._weights = {point: 3 ** i for i, point in enumerate(points)}
+
+    def close(self):
+        self._map.close()
+
+    def index(self, board):
+        """ Ternary index of the stones of a GoBoard of the table's size """
+        index = 0
+        for color in reversed(self._read_points(board.board)):
+            index = 3 * index + int(color)
+        return index
+
+    def _value(self, board, color):
+        if board.size != self.size or board.ko_constraint is not None:
+            return None, None
+        if color != color_to_move(board._stone_count[BLACK], board._stone_count[WHITE]):
+            return None, None
+        index = self.index(board)
+        value = self._map[HEADER.size + index]
+        if not value:
+            return None, None
+        return value, index
+
+    def probe(self, board, color):
+        """
+        Perfect play value of the position on board with color to move
+
+        Returns
+        -------
+        (win, distance): whether color wins and in how many moves the game ends,
+        or None if the position is not in the table
+        """
+        value, _ = self._value(board, color)
+        if value is None:
+            return None
+        return bool(value & WIN), value & DISTANCE
+
+    def best_move(self, board, color):
+        """
+        A perfect play move of color: the fastest win, or the slowest loss
+
+        Returns
+        -------
+        (win, distance, move), move being None if color has no legal move;
+        None if the position is not in the table
+        """
+        value, index = self._value(board, color)
+        if value is None:
+            return None
+        win = bool(value & WIN)
+        distance = value & DISTANCE
+        if distance == 0:
+            return win, 0, None
+        # the children are the opponent's positions at distance - 1, lost for it if color wins
+        wanted = (LOSS if win else WIN) | (distance - 1)
+        base = HEADER.size + index
+        for move in board.get_legal_moves(color):
+            if self._map[base + color * self._weights[move]] == wanted:
+                return win, distance, move
+        raise ValueError("{} does not match the position".format(self.path))
+
+    def move_values(self, board, color):
+        """
+        Perfect play value of every legal move of color, one byte read each
+
+        Returns
+        -------
+        list of (move, win, distance): whether color wins after move and in how
+        many moves from now the game ends; None if the position is not in the table
+        """
+        value, index = self._value(board, color)
+        if value is None:
+            return None
+        base = HEADER.size + index
+        result = []
+        for move in board.get_legal_moves(color):
+            child = self._map[base + color * self._weights[move]]
+            # the child is the opponent's to move: lost for it means won for color
+            result.append((move, bool(child & LOSS), (child & DISTANCE) + 1))
+        return result
+
+
+def _decode(indices, bits):
+    """ Black and white stone masks of an array of ternary indices """
+    digits = (indices[:, None] // 3 ** np.arange(len(bits), dtype=np.int64)) % 3
+    black = ((digits == BLACK) * bits).sum(axis=1)
+    white = ((digits == WHITE) * bits).sum(axis=1)
+    return black, white
+
+
+def generate(size, log=None):
+    """
+    Solve every position reachable from the empty board
+
+    Arguments
+    ---------
+    size : int
+        at most MAX_SIZE
+    log : file or None
+        progress lines go here
+
+    Returns
+    -------
+    (table, positions): the bytearray of values by ternary index and the number
+    of positions in it
+    """
+    if not 0 < size <= MAX_SIZE:
+        raise ValueError("tablebases go up to {0}x{0}".format(MAX_SIZE))
+    start = time.time()
+    bitboard = BitBoard.for_size(size)
+    points = BoardGeometry.for_size(size).points
+    # index offset of one stone, by its bit in the stone masks
+    weights = {1 << point: 3 ** i for i, point in enumerate(points)}
+    bits = np.array([1 << point for point in points], dtype=np.int64)
+    table = bytearray(3 ** len(points))
+
+    layers = []
+    layer = {0: (0, 0)}
+    while layer:
+        layers.append(np.array(sorted(layer), dtype=np.int64))
+        black_moves = len(layers) % 2 == 1
+        following = {}
+        for index, (black, white) in layer.items():
+            if black_moves:
+                legal = bitboard.legal_mask(black, white)
+            else:
+                legal = bitboard.legal_mask(white, black)
+            while legal:
+                bit = legal & -legal
+                legal ^= bit
+                if black_moves:
+                    following[index + weights[bit]] = (black | bit, white)
+                else:
+                    following[index + 2 * weights[bit]] = (black, white | bit)
+        if log is not None:
+            log.write("forward: {} stones, {} positions, {:.1f}s\n".format(
+                len(layers) - 1, len(layer), time.time() - start))
+        layer = following
+
+    for stones in reversed(range(len(layers))):
+        color = BLACK if stones % 2 == 0 else WHITE
+        indices = layers[stones]
+        black_masks, white_masks = _decode(indices, bits)
+        for index, black, white in zip(indices.tolist(), black_masks.tolist(), white_masks.tolist()):
+            if color == BLACK:
+                legal = bitboard.legal_mask(black, white)
+            else:
+                legal = bitboard.legal_mask(white, black)
+            fastest_win = None
+            slowest_loss = 0
+            while legal:
+                bit = legal & -legal
+                legal ^= bit
+                child = table[index + color * weights[bit]]
+                distance = child & DISTANCE
+                if child & LOSS:
+                    if fastest_win is None or distance < fastest_win:
+                        fastest_win = distance
+                elif distance + 1 > slowest_loss:
+                    slowest_loss = distance + 1
+            if fastest_win is not None:
+                table[index] = WIN | (fastest_win + 1)
+            else:
+                table[index] = LOSS | slowest_loss
+        if log is not None:
+            log.write("backward: {} stones, {:.1f}s\n".format(stones, time.time() - start))
+    return table, sum(len(layer) for layer in layers)
+
+
+def write(path, size, table, positions):
+    """ Write a table file, replacing path only once it is complete """
+    partial = path + ".partial"
+    with open(partial, "wb") as f:
+        f.write(HEADER.pack(MAGIC, size, positions))
+        f.write(table)
+    os.replace(partial, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a NoGo endgame tablebase")
+    parser.add_argument("--size", type=int, default=4, help="board size, at most {}".format(MAX_SIZE))
+    parser.add_argument("--output", default=None, metavar="PATH", help="table file, nogo<size>.tb by default")
+    args = parser.parse_args()
+    path = args.output or "nogo{}.tb".format(args.size)
+    table, positions = generate(args.size, log=sys.stderr)
+    write(path, args.size, table, positions)
+    first = table[0]
+    sys.stderr.write("{}: {} positions, the first player {} in {} moves\n".format(
+        path, positions, "wins" if first & WIN else "loses", first & DISTANCE))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Time control for GTP play.
+
+TimeManager keeps the clock given by the GTP time_settings/time_left commands
+and turns it into a deadline for the next move: the remaining main time is spread
+over the moves the player can still expect to make (about half of the empty
+points in NoGo), byo-yomi time is spread over the stones of the period, and a
+safety margin is kept back for the GTP round trip and the genmove_cmd overhead.
+"""
+
+import time
+from board_util import BLACK, WHITE
+
+
+class TimeManager(object):
+
+    def __init__(self, safety_margin=0.1, min_move_time=0.01):
+        """
+        Arguments
+        ---------
+        safety_margin : float
+            seconds kept back on every move
+        min_move_time : float
+            shortest thinking time handed out
+        """
+        self.safety_margin = safety_margin
+        self.min_move_time = min_move_time
+        self.main_time = None
+        self.byo_yomi_time = 0
+        self.byo_yomi_stones = 0
+        self.new_game()
+
+    def new_game(self):
+        """ Restart both clocks from the time settings """
+        if self.main_time == 0 and self.byo_yomi_stones > 0:
+            # byo-yomi only: the game starts in the first period
+            self.time_left = {BLACK: self.byo_yomi_time, WHITE: self.byo_yomi_time}
+            self.stones_left = {BLACK: self.byo_yomi_stones, WHITE: self.byo_yomi_stones}
+            return
+        main_time = self.main_time or 0
+        self.time_left = {BLACK: main_time, WHITE: main_time}
+        self.stones_left = {BLACK: 0, WHITE: 0}
+
+    def time_settings(self, main_time, byo_yomi_time, byo_yomi_stones):
+        """
+        Set the time control, as in the GTP time_settings command.
+        byo_yomi_time > 0 with byo_yomi_stones = 0 means no time limit.
+        """
+        if byo_yomi_time > 0 and byo_yomi_stones == 0:
+            self.main_time = None
+        else:
+            self.main_time = main_time
+        self.byo_yomi_time = byo_yomi_time
+        self.byo_yomi_stones = byo_yomi_stones
+        self.new_game()
+
+    def set_time_left(self, color, seconds, stones):
+        """
+        Update a clock, as in the GTP time_left command.
+        stones = 0 means color is still in main time.
+        """
+        self.time_left[color] = seconds
+        self.stones_left[color] = stones
+
+    def used(self, color, seconds):
+        """ Charge seconds of thinking to the clock of color """
+        if self.main_time is None:
+            return
+        if self.stones_left[color] > 0:
+            self.stones_left[color] -= 1
+            if self.stones_left[color] == 0:
+                # a new byo-yomi period starts
+                self.time_left[color] = self.byo_yomi_time
+                self.stones_left[color] = self.byo_yomi_stones
+            else:
+                self.time_left[color] -= seconds
+            return
+        self.time_left[color] -= seconds
+        if self.time_left[color] <= 0 and self.byo_yomi_stones > 0:
+            self.time_left[color] = self.byo_yomi_time
+            self.stones_left[color] = self.byo_yomi_stones
+
+    def move_time(self, board, color):
+        """
+        Thinking time for the next move of color.
+
+        Arguments
+        ---------
+        board : GoBoard
+        color : {BLACK, WHITE}
+
+        Returns
+        -------
+        seconds, or None if there is no time limit
+        """
+        if self.main_time is None:
+            return None
+        left = self.time_left[color]
+        if self.stones_left[color] > 0:
+            budget = left / self.stones_left[color]
+        else:
+            stones = sum(len(s) for s in board._stones.values())
+            empty_points = board.size*board.size - stones
+            # each player fills about half of the remaining points in NoGo
+            moves_left = max(1, (empty_points + 1) // 2)
+            budget = left / moves_left
+            if self.byo_yomi_stones > 0:
+                # main time runs out into byo-yomi, which pays for at least one move
+                budget = max(budget, min(left, self.byo_yomi_time / self.byo_yomi_stones))
+        return max(self.min_move_time, budget - self.safety_margin)
+
+    def move_deadline(self, board, color, start=None):
+        """
+        Absolute time.time() by which the next move of color must be chosen.
+
+        Arguments
+        ---------
+        board : GoBoard
+        color : {BLACK, WHITE}
+        start : float, optional
+            when the genmove command was received, now by default
+
+        Returns
+        -------
+        deadline, or None if there is no time limit
+        """
+        seconds = self.move_time(board, color)
+        if seconds is None:
+            return None
+        if start is None:
+            start = time.time()
+        return start + seconds
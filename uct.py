@@ -0,0 +1,292 @@
+"""
+UCT Monte Carlo tree search over GoBoard with NoGo rules.
+
+The tree is stored in parallel numpy arrays instead of one Python object per node:
+    visits[n]      : number of playouts through node n
+    wins[n]        : playouts won by the player who made the move leading to n
+    move[n]        : point played to reach n
+    first_child[n] : index of the first child of n, -1 if n is not expanded
+    num_children[n]: number of children of n; the children of a node are contiguous
+This costs 16 bytes per node, so millions of nodes fit easily.
+
+After a move is played on the real board, advance() makes the matching child the
+new root so the statistics gathered for that subtree are kept. When the arrays are
+full the tree is compacted to the subtree below the root.
+"""
+
+import math
+import random
+import time
+
+import numpy as np
+from board_util import GoBoardUtil
+from engine_stats import STATS
+
+# playouts between two calls of the feed of search
+FEED_INTERVAL = 16
+
+
+class UctTree(object):
+
+    def __init__(self, max_nodes=2000000, exploration=0.4):
+        """
+        Arguments
+        ---------
+        max_nodes : int
+            largest number of nodes kept in memory
+        exploration : float
+            UCB exploration constant
+        """
+        self.max_nodes = max_nodes
+        self.exploration = exploration
+        self.clear()
+
+    def clear(self):
+        """ Drop the whole tree """
+        self._allocate(min(4096, self.max_nodes))
+        self.root = 0
+        self.num_nodes = 1
+        self.root_key = None
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        self.wins = np.zeros(capacity, dtype=np.float32)
+        self.move = np.full(capacity, -1, dtype=np.int16)
+        self.first_child = np.full(capacity, -1, dtype=np.int32)
+        self.num_children = np.zeros(capacity, dtype=np.int16)
+
+    def _grow(self, needed):
+        """
+        Make room for needed more nodes.
+
+        Returns
+        -------
+        bool: False if the tree is at max_nodes even after compaction
+        """
+        if self.num_nodes + needed <= self.capacity:
+            return True
+        if self.capacity < self.max_nodes:
+            capacity = min(self.max_nodes, max(self.capacity*2, self.num_nodes + needed))
+            for name in ("visits", "wins", "move", "first_child", "num_children"):
+                old = getattr(self, name)
+                new = np.resize(old, capacity)
+                new[len(old):] = -1 if name in ("move", "first_child") else 0
+                setattr(self, name, new)
+            self.capacity = capacity
+            return self.num_nodes + needed <= self.capacity
+        self._compact()
+        return self.num_nodes + needed <= self.capacity
+
+    def _compact(self):
+        """ Keep only the subtree of the root, renumbered from 0 """
+        if self.root == 0:
+            # nothing to drop
+            return
+        old = (self.visits, self.wins, self.move, self.first_child, self.num_children)
+        self._allocate(self.capacity)
+        visits, wins, move, first_child, num_children = old
+        self.visits[0] = visits[self.root]
+        self.wins[0] = wins[self.root]
+        self.move[0] = move[self.root]
+        queue = [(self.root, 0)]
+        count = 1
+        while queue:
+            old_node, new_node = queue.pop()
+            first, n = first_child[old_node], num_children[old_node]
+            if first < 0:
+                continue
+            self.first_child[new_node] = count
+            self.num_children[new_node] = n
+            self.visits[count:count+n] = visits[first:first+n]
+            self.wins[count:count+n] = wins[first:first+n]
+            self.move[count:count+n] = move[first:first+n]
+            queue.extend((first + i, count + i) for i in range(n))
+            count += n
+        self.root = 0
+        self.num_nodes = count
+
+    def _expand(self, node, moves):
+        """ Add one child per move below node, if there is room """
+        n = len(moves)
+        if n == 0 or self.num_nodes + n > self.capacity:
+            return False
+        first = self.num_nodes
+        self.move[first:first+n] = moves
+        self.first_child[node] = first
+        self.num_children[node] = n
+        self.num_nodes += n
+        return True
+
+    def _select(self, node):
+        """ Return the child of node with the highest UCB value """
+        first = self.first_child[node]
+        n = self.num_children[node]
+        visits = self.visits[first:first+n]
+        unvisited = np.flatnonzero(visits == 0)
+        if unvisited.size:
+            return first + unvisited[random.randrange(unvisited.size)]
+        log_parent = math.log(self.visits[node])
+        ucb = self.wins[first:first+n] / visits + self.exploration*np.sqrt(log_parent / visits)
+        return first + int(np.argmax(ucb))
+
+    def _playout(self, board, color):
+        """
+        Play random moves until the side to move cannot move, then take them back.
+
+        Returns
+        -------
+        winner : the color that made the last move
+        """
+        played = 0
+        while True:
+            move = board.random_legal_move(color)
+            if move is None:
+                break
+            board.play_undoable(move, color)
+            played += 1
+            color = GoBoardUtil.opponent(color)
+        for _ in range(played):
+            board.undo()
+        if STATS.enabled:
+            STATS.playout(played)
+        return GoBoardUtil.opponent(color)
+
+    def _run_once(self, board, color):
+        """ One selection, expansion, playout and backup from the root """
+        # make room for one expansion first; compacting renumbers the nodes
+        self._grow(board.size*board.size)
+        node = self.root
+        path = [node]
+        played = 0
+        while self.first_child[node] >= 0:
+            node = self._select(node)
+            board.play_undoable(int(self.move[node]), color)
+            played += 1
+            color = GoBoardUtil.opponent(color)
+            path.append(node)
+        if self.visits[node] > 0 or node == self.root:
+            moves = board.get_legal_moves(color)
+            if self._expand(node, moves):
+                node = self._select(node)
+                board.play_undoable(int(self.move[node]), color)
+                played += 1
+                color = GoBoardUtil.opponent(color)
+                path.append(node)
+        winner = self._playout(board, color)
+        for _ in range(played):
+            board.undo()
+        # the player who moved into a node is the opponent of the side to move there
+        for n in reversed(path):
+            self.visits[n] += 1
+            if winner != color:
+                self.wins[n] += 1
+            color = GoBoardUtil.opponent(color)
+
+    def _key(self, board, color):
+        return (board.size, board._stone_hash, color)
+
+    def search(self, board, color, num_playouts=None, deadline=None, stop=None, feed=None):
+        """
+        Run UCT from the position on board with color to move.
+
+        Arguments
+        ---------
+        board : GoBoard
+            left unchanged (moves are played and taken back with play_undoable/undo)
+        color : {BLACK, WHITE}
+        num_playouts : int, optional
+            stop after this many playouts
+        deadline : float, optional
+            stop when time.time() passes this value
+        stop : threading.Event, optional
+            stop as soon as it is set (used for pondering)
+        feed : callable, optional
+            called every FEED_INTERVAL playouts and at the end, from this thread,
+            to add results found elsewhere (see add_root_results)
+
+        Returns
+        -------
+        number of playouts run
+        """
+        key = self._key(board, color)
+        if key != self.root_key:
+            self.clear()
+            self.root_key = key
+        count = 0
+        while True:
+            if num_playouts is not None and count >= num_playouts:
+                break
+            if deadline is not None and time.time() >= deadline:
+                break
+            if stop is not None and stop.is_set():
+                break
+            self._run_once(board, color)
+            count += 1
+            if feed is not None and count % FEED_INTERVAL == 0:
+                feed()
+            if self.first_child[self.root] >= 0 and self.num_children[self.root] == 1 \
+                    and deadline is not None and num_playouts is None:
+                # a forced move does not need any more thinking
+                break
+        if feed is not None:
+            feed()
+        return count
+
+    def best_move(self):
+        """ Return the most visited move at the root, None if the root has no children """
+        first = self.first_child[self.root]
+        if first < 0:
+            return None
+        n = self.num_children[self.root]
+        return int(self.move[first + int(np.argmax(self.visits[first:first+n]))])
+
+    def add_root_results(self, stats):
+        """
+        Add playouts run outside the tree (e.g. by a PlayoutPool) to the children of
+        the root
+
+        Arguments
+        ---------
+        stats : dict
+            point -> (wins of the side to move at the root, playouts)
+
+        Returns
+        -------
+        number of playouts added
+        """
+        first = self.first_child[self.root]
+        if first < 0:
+            return 0
+        added = 0
+        for child in range(first, first + self.num_children[self.root]):
+            result = stats.get(int(self.move[child]))
+            if result is not None:
+                self.wins[child] += result[0]
+                self.visits[child] += result[1]
+                added += result[1]
+        self.visits[self.root] += added
+        return added
+
+    def advance(self, board, point, color):
+        """
+        Keep the subtree of the move color played on point.
+
+        Arguments
+        ---------
+        board : GoBoard
+            the board after the move has been played
+        point, color
+            the move just played
+        """
+        first = self.first_child[self.root]
+        if self.root_key is None or self.root_key[2] != color or first < 0:
+            self.clear()
+            return
+        n = self.num_children[self.root]
+        children = np.flatnonzero(self.move[first:first+n] == point)
+        if not children.size:
+            self.clear()
+            return
+        self.root = first + int(children[0])
+        self.root_key = self._key(board, GoBoardUtil.opponent(color))